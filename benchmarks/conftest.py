@@ -0,0 +1,39 @@
+"""
+Fixtures for the benchmarks, generated data lives in synthetic.py and the mongomock db fixture is in the root conftest.py
+"""
+import pytest
+from pathlib import Path
+from typing import Callable, List
+from synthetic import LARGE_SIZE, synthetic_run_folder
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption("--large", action="store_true", help=f"also run the benchmarks with {LARGE_SIZE} samples or more")
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item]) -> None:
+    if config.getoption("--large"):
+        return
+    skip_large = pytest.mark.skip(reason=f"{LARGE_SIZE}+ samples, run with --large")
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is not None and callspec.params.get("n_samples", 0) >= LARGE_SIZE:
+            item.add_marker(skip_large)
+
+
+@pytest.fixture
+def run_folder(tmp_path: Path) -> Callable[..., Path]:
+    def _run_folder(n_samples: int, mode: str = "SEQ", extra_columns: int = 3, rename: bool = False) -> Path:
+        return synthetic_run_folder(tmp_path / f"run_{mode}_{n_samples}", n_samples, mode, extra_columns, rename)
+    return _run_folder
+
+
+@pytest.fixture
+def scripts(tmp_path: Path) -> Path:
+    """Pre, per sample and post script templates using run and sample placeholders"""
+    folder = tmp_path / "scripts"
+    folder.mkdir()
+    (folder / "pre.sh").write_text("echo start $run.name\n")
+    (folder / "per_sample.sh").write_text("mkdir -p $sample.display_name && echo $sample._id $sample.categories.sample_info.summary.provided_species\n")
+    (folder / "post.sh").write_text("echo done $run.name\n")
+    return folder
@@ -0,0 +1,82 @@
+"""
+Helpers for generating synthetic run folders and metadata sheets used by the benchmarks
+"""
+import argparse
+import json
+import os
+import time
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List
+
+
+BENCHMARK_SIZES = [100, 1000, 10000]
+RUN_PIPELINE_SIZES = [10, 100, 1000, 10000]
+LARGE_SIZE = 10000 # parametrizations with at least this many samples take minutes, they only run with --large
+# sheet columns as a sequencer export names them, rename.json maps them to bifrost names
+RENAMED_COLUMNS = {"SampleID": "sample_name", "Organism": "provided_species"}
+
+
+def synthetic_metadata(n_samples: int, mode: str = "SEQ", extra_columns: int = 3) -> pd.DataFrame:
+    """Builds a run_metadata sheet with n_samples rows and matching filenames"""
+    sample_names = [f"S{i:06d}" for i in range(n_samples)]
+    if mode == "SEQ":
+        filenames = [f"{name}_R1.fastq.gz/{name}_R2.fastq.gz" for name in sample_names]
+    else:
+        filenames = [f"{name}.fasta" for name in sample_names]
+    columns: Dict[str, List] = {
+        "sample_name": sample_names,
+        "provided_species": ["Staphylococcus aureus"] * n_samples,
+        "filenames": filenames,
+    }
+    for i in range(extra_columns):
+        columns[f"optional_field_{i}"] = [f"value_{i}_{j}" for j in range(n_samples)]
+    return pd.DataFrame(columns)
+
+
+def synthetic_run_folder(path: Path, n_samples: int, mode: str = "SEQ", extra_columns: int = 3, rename: bool = False) -> Path:
+    """Writes empty read stubs or one contig assemblies and a run_metadata.tsv for n_samples into path
+
+    With rename the sheet uses the RENAMED_COLUMNS names and a rename.json mapping them back is written.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    metadata = synthetic_metadata(n_samples, mode, extra_columns)
+    for filenames in metadata["filenames"]:
+        for filename in filenames.split("/"):
+            if mode == "SEQ":
+                (path / filename).touch()
+            else:
+                (path / filename).write_text(">contig_1\nACGT\n")
+    if rename:
+        metadata = metadata.rename(columns={value: key for key, value in RENAMED_COLUMNS.items()})
+        (path / "rename.json").write_text(json.dumps(RENAMED_COLUMNS))
+    metadata.to_csv(path / "run_metadata.tsv", sep="\t", index=False)
+    return path
+
+
+def pipeline_args(run_folder: Path, outdir: Path, scripts: Path, **options) -> argparse.Namespace:
+    """Options of pipeline.run_pipeline as the launcher sets them by default, for a synthetic run folder
+
+    scripts is a folder with pre.sh, per_sample.sh and post.sh, options override the defaults.
+    """
+    args = dict(
+        outdir=str(outdir), run_id=None, run_name=outdir.name, run_type="benchmark", re_run=False, incremental=False,
+        reads_folder=str(run_folder), run_metadata=str(run_folder / "run_metadata.tsv"),
+        run_metadata_column_remap=str(run_folder / "rename.json") if (run_folder / "rename.json").is_file() else None,
+        pre_script=str(scripts / "pre.sh"), per_sample_script=str(scripts / "per_sample.sh"), post_script=str(scripts / "post.sh"),
+        per_sample_asm_script=None, component={"_id": {"$oid": "0" * 24}, "name": "run_launcher__benchmark"},
+        component_subset="bifrost_min_read_check", sample_subset=None, check_reads=False, min_reads=0, jobs=None,
+        no_cache=True, metadata_columns=None, metadata_engine="pandas", recursive_scan=False, db_writers=0,
+        shard_size=0, execute=False, scheduler=None, snapshot_compress=False, from_snapshot=False, plan=False, debug=False)
+    args.update(options)
+    return argparse.Namespace(**args)
+
+
+class Timer:
+    """Context manager recording wall time in seconds"""
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
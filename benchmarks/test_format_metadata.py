@@ -0,0 +1,87 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+from synthetic import Timer
+from bifrost_run_launcher import pipeline
+
+
+def legacy_format_metadata(run_metadata, rename_column_file=None) -> pd.DataFrame:
+    """format_metadata as it was before vectorization, kept as the baseline for the benchmark"""
+    df = pd.read_table(run_metadata)
+    if rename_column_file is not None:
+        with open(rename_column_file, "r") as rename_file:
+            df = df.rename(columns=json.load(rename_file))
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    samples_no_index = df[df["sample_name"].isna()].index
+    samples_no_files_index = df[df["filenames"].isnull()].index
+    idx_to_drop = samples_no_index.union(samples_no_files_index)
+    missing_files = ", ".join([df["sample_name"].iloc[i] for i in samples_no_files_index])
+    if len(missing_files) > 0:
+        print(f"samples {missing_files} missing files.")
+    df = df.drop(idx_to_drop)
+    df["temp_sample_name"] = df["sample_name"]
+    df["sample_name"] = df["sample_name"].astype(str).str.strip()
+    df["sample_name"] = df["sample_name"].str.replace(r"[^a-zA-Z0-9-_]", "_", regex=True)
+    df["changed_sample_names"] = df['sample_name'] != df['temp_sample_name']
+    df["duplicated_sample_names"] = df.duplicated(subset="sample_name", keep="first")
+    df["filenames"] = df["filenames"].apply(lambda x: tuple(x.strip().split('/')))
+    df["haveReads"] = False
+    df["haveAsm"] = False
+    df["haveMetaData"] = True
+    df = df.map(lambda x: None if pd.isna(x) else x)
+    return df
+
+
+def wide_sheet(path, n_rows: int, n_columns: int) -> str:
+    """Sheet with string, integer, float and sparse columns, some rows missing files"""
+    rng = np.random.default_rng(0)
+    columns = {
+        "sample_name": [f" S{i} " if i % 97 == 0 else f"S{i}" for i in range(n_rows)],
+        "filenames": [None if i % 1013 == 5 else f"S{i}_R1.fastq.gz/S{i}_R2.fastq.gz" for i in range(n_rows)],
+        "provided_species": ["Staphylococcus aureus"] * n_rows,
+    }
+    for i in range(n_columns - len(columns)):
+        if i % 3 == 0:
+            columns[f"text_{i}"] = [None if j % 7 == 0 else f"value_{j % 50}" for j in range(n_rows)]
+        elif i % 3 == 1:
+            columns[f"count_{i}"] = rng.integers(0, 1000, n_rows)
+        else:
+            values = rng.random(n_rows)
+            values[::11] = np.nan
+            columns[f"ratio_{i}"] = values
+    pd.DataFrame(columns).to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+def test_same_records_as_legacy(tmp_path):
+    sheet = wide_sheet(tmp_path / "run_metadata.tsv", 2000, 12)
+    legacy = legacy_format_metadata(sheet)
+    current = pipeline.format_metadata(sheet)
+    assert list(current.columns) == list(legacy.columns)
+    # legacy relied on DataFrame.map to turn NA into None, which newer pandas converts back to NaN for string columns
+    legacy_records = [{key: None if not isinstance(value, tuple) and pd.isna(value) else value for key, value in record.items()}
+                      for record in legacy.to_dict(orient="records")]
+    assert pipeline.metadata_to_records(current) == legacy_records
+
+
+@pytest.mark.parametrize("n_rows,n_columns", [(50000, 60)])
+def test_format_metadata_wide(tmp_path, n_rows, n_columns):
+    sheet = wide_sheet(tmp_path / "run_metadata.tsv", n_rows, n_columns)
+    with Timer() as legacy_timer:
+        legacy_format_metadata(sheet).to_dict(orient="records")
+    with Timer() as timer:
+        metadata = pipeline.format_metadata(sheet)
+        pipeline.metadata_to_records(metadata)
+    print(f"format_metadata {n_rows}x{n_columns}: legacy {legacy_timer.elapsed:.2f}s, current {timer.elapsed:.2f}s (including records)")
+    assert timer.elapsed < legacy_timer.elapsed
+
+
+@pytest.mark.parametrize("engine,columns", [("pandas", None), ("pandas", ["count_1"]), ("arrow", None), ("arrow", ["count_1"])])
+def test_metadata_engines(tmp_path, engine, columns):
+    if engine == "arrow":
+        pytest.importorskip("pyarrow")
+    sheet = wide_sheet(tmp_path / "run_metadata.tsv", 50000, 60)
+    with Timer() as timer:
+        metadata = pipeline.format_metadata(sheet, columns=columns, engine=engine)
+    print(f"format_metadata 50000x60 engine={engine} columns={columns}: {timer.elapsed:.2f}s, {metadata.memory_usage(deep=True).sum() / 1e6:.0f}MB")
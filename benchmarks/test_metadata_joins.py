@@ -0,0 +1,28 @@
+import os
+import pytest
+from synthetic import BENCHMARK_SIZES, Timer
+from bifrost_run_launcher import pipeline
+
+
+@pytest.mark.parametrize("n_samples", BENCHMARK_SIZES)
+def test_parse_directory(run_folder, n_samples):
+    folder = run_folder(n_samples)
+    run_metadata = os.path.join(folder, "run_metadata.tsv")
+    metadata = pipeline.format_metadata(run_metadata)
+    with Timer() as timer:
+        sample_dict, unused_files, sample_modes = pipeline.parse_directory(str(folder), pipeline.get_file_pairs(metadata), metadata, "run_metadata.tsv")
+    print(f"parse_directory {n_samples} samples: {timer.elapsed:.3f}s")
+    assert len(sample_dict) == n_samples
+    assert unused_files == []
+
+
+@pytest.mark.parametrize("n_samples", BENCHMARK_SIZES)
+def test_sample_metadata_lookup(run_folder, n_samples):
+    folder = run_folder(n_samples)
+    metadata = pipeline.format_metadata(os.path.join(folder, "run_metadata.tsv"))
+    with Timer() as timer:
+        rows_by_sample_name = pipeline.index_metadata(metadata, "sample_name")
+        records = pipeline.metadata_to_records(metadata)
+        found = [records[rows_by_sample_name[name][0]] for name in metadata["sample_name"]]
+    print(f"sample metadata lookup {n_samples} samples: {timer.elapsed:.3f}s")
+    assert len(found) == n_samples
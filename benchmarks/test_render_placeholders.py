@@ -0,0 +1,62 @@
+import pytest
+from synthetic import Timer
+from bifrostlib.datahandling import Sample
+from bifrost_run_launcher import pipeline
+
+
+PLACEHOLDER_COUNTS = [100, 500]
+SAMPLE_COUNTS = [100, 1000]
+
+
+def walk_from_root(item, sample_json):
+    """Placeholder resolution before accessors were compiled, splitting and walking the path on every lookup"""
+    level = sample_json
+    for value in item.split(".")[1:]:
+        if value.endswith("]"):
+            (array_item, index) = value.split("[")
+            level = level[array_item][int(index[:-1])]
+        elif value.endswith("id"):
+            level = level[value]['$oid']
+        else:
+            level = level[value]
+    return level
+
+
+def synthetic_template(n_placeholders):
+    """Per sample script with n_placeholders placeholders over a tenth as many unique paths, as templates repeat the read paths
+
+    Field names are zero padded as a placeholder that is a prefix of another makes ScriptTemplate fall back to replace_sample_info_in_script.
+    """
+    paths = ["$sample.categories.paired_reads.summary.data[0]", "$sample.categories.paired_reads.summary.data[1]", "$sample._id"]
+    paths += [f"$sample.categories.sample_info.summary.field_{i:04d}" for i in range(max(n_placeholders // 10 - len(paths), 0))]
+    return "".join(f"echo {paths[i % len(paths)]} >> $sample.name/out;\n" for i in range(n_placeholders // 2))
+
+
+def synthetic_samples(n_samples, n_fields):
+    samples = []
+    for i in range(n_samples):
+        sample = Sample(name=f"S{i}")
+        sample["_id"] = {"$oid": f"{i:024d}"}
+        sample["categories"] = {
+            "paired_reads": {"summary": {"data": [f"/reads/S{i}_R1.fastq.gz", f"/reads/S{i}_R2.fastq.gz"]}},
+            "sample_info": {"summary": {f"field_{field:04d}": f"value_{i}_{field}" for field in range(n_fields)}},
+        }
+        samples.append(sample)
+    return samples
+
+
+@pytest.mark.parametrize("n_samples", SAMPLE_COUNTS)
+@pytest.mark.parametrize("n_placeholders", PLACEHOLDER_COUNTS)
+def test_render_placeholders(n_samples, n_placeholders, monkeypatch):
+    script = synthetic_template(n_placeholders)
+    samples = synthetic_samples(n_samples, n_placeholders // 10)
+    with Timer() as compiled_timer:
+        template = pipeline.ScriptTemplate(script)
+        rendered = [template.render(sample) for sample in samples]
+
+    monkeypatch.setattr(pipeline, "resolve_sample_placeholder", walk_from_root)
+    with Timer() as walk_timer:
+        walked = [pipeline.replace_sample_info_in_script(script, sample) for sample in samples]
+    print(f"render {n_placeholders} placeholders ({len(template.placeholders)} unique) x {n_samples} samples: "
+          f"compiled {compiled_timer.elapsed:.3f}s, walked from root per occurrence {walk_timer.elapsed:.3f}s")
+    assert rendered == walked
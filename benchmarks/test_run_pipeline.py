@@ -0,0 +1,71 @@
+import json
+import os
+import pytest
+from synthetic import RUN_PIPELINE_SIZES, pipeline_args
+from bifrost_run_launcher import pipeline
+
+
+# A phase taking this many times longer per sample at the larger size is not linear, quadratic paths grow with the size ratio.
+# Loose on purpose, timings on a loaded CI runner vary a lot, this only catches a path going quadratic
+SCALING_FACTOR = 5
+SCALING_SIZES = (250, 2000)
+SCALING_REPEATS = 3 # the fastest of the repeats is compared
+MIN_PHASE_SECONDS = 0.2 # phases faster than this are too noisy to compare
+
+
+def launch(run_folder, tmp_path, scripts, n_samples, mode="SEQ", **options):
+    """Runs run_pipeline on a synthetic folder and returns the launch report"""
+    folder = run_folder(n_samples, mode, rename=True)
+    outdir = tmp_path / f"out_{mode}_{n_samples}"
+    pipeline.run_pipeline(pipeline_args(folder, outdir, scripts, **options))
+    with open(outdir / "launch_report.json") as fh:
+        report = json.load(fh)
+    results_file = os.environ.get("BIFROST_BENCHMARK_RESULTS", None)
+    if results_file is not None: # one json line per launch, for tracking in CI
+        with open(results_file, "a") as fh:
+            fh.write(json.dumps({"n_samples": n_samples, "mode": mode, **options, **report}) + "\n")
+    return report
+
+
+def print_report(name, report):
+    print(f"\n{name}")
+    for phase, seconds in report["phases"].items():
+        print(f"  {phase:<16} {seconds:9.3f}s {report['peak_rss_growth_kb'].get(phase, 0) / 1024:9.1f}MiB peak growth")
+
+
+@pytest.mark.parametrize("n_samples", RUN_PIPELINE_SIZES)
+@pytest.mark.parametrize("mode", ["SEQ", "ASM"])
+def test_run_pipeline(db, run_folder, tmp_path, scripts, capsys, n_samples, mode):
+    report = launch(run_folder, tmp_path, scripts, n_samples, mode)
+    with capsys.disabled():
+        print_report(f"run_pipeline {mode} {n_samples} samples", report)
+    assert report["counters"]["samples_saved"] == n_samples
+    assert db.samples.count_documents({}) == n_samples
+
+
+@pytest.mark.parametrize("options", [{"db_writers": 4}, {"shard_size": 10}])
+def test_run_pipeline_options(db, run_folder, tmp_path, scripts, capsys, options):
+    report = launch(run_folder, tmp_path, scripts, 1000, **options)
+    with capsys.disabled():
+        print_report(f"run_pipeline 1000 samples {options}", report)
+    assert report["counters"]["samples_saved"] == 1000
+
+
+def fastest_phases(db, run_folder, tmp_path, scripts, n_samples):
+    """Fastest time of each phase over SCALING_REPEATS launches, each into an empty DB so every launch inserts all samples"""
+    phases = {}
+    for repeat in range(SCALING_REPEATS):
+        db.samples.delete_many({})
+        db.runs.delete_many({})
+        for phase, seconds in launch(run_folder, tmp_path, scripts, n_samples)["phases"].items():
+            phases[phase] = min(seconds, phases.get(phase, seconds))
+    return phases
+
+
+def test_phases_scale_linearly(db, run_folder, tmp_path, scripts):
+    small, large = (fastest_phases(db, run_folder, tmp_path, scripts, n_samples) for n_samples in SCALING_SIZES)
+    ratio = SCALING_SIZES[1] / SCALING_SIZES[0]
+    not_linear = {phase: f"{small[phase]:.3f}s -> {seconds:.3f}s"
+                  for phase, seconds in large.items()
+                  if seconds > MIN_PHASE_SECONDS and seconds > SCALING_FACTOR * ratio * max(small[phase], MIN_PHASE_SECONDS / ratio)}
+    assert not_linear == {}
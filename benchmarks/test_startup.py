@@ -0,0 +1,35 @@
+import os
+import sys
+import subprocess
+from typing import Dict
+
+
+# Budget for importing the launcher, well above the ~50ms it takes with lazy imports but below the
+# seconds it takes once pandas/pymongo/bifrostlib are pulled in at import time.
+IMPORT_BUDGET_US = 300000
+HEAVY_MODULES = ["pandas", "pymongo", "bifrostlib", "Bio", "bifrost_run_launcher.pipeline"]
+
+
+def importtime(*args: str) -> Dict[str, int]:
+    """Runs python -X importtime and returns the cumulative import time in microseconds per module"""
+    env = {key: value for key, value in os.environ.items() if key != "BIFROST_DB_KEY"}
+    process = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True, env=env)
+    assert process.returncode == 0, process.stderr
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def test_launcher_import_is_light():
+    cumulative = importtime("-c", "import bifrost_run_launcher.launcher")
+    print(f"bifrost_run_launcher.launcher import: {cumulative['bifrost_run_launcher.launcher']}us")
+    assert [module for module in HEAVY_MODULES if module in cumulative] == []
+    assert cumulative["bifrost_run_launcher.launcher"] < IMPORT_BUDGET_US
+
+
+def test_help_without_database():
+    cumulative = importtime("-m", "bifrost_run_launcher", "--help")
+    assert [module for module in HEAVY_MODULES if module in cumulative] == []
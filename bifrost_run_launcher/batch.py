@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Launches many run folders in one go on a pool of worker processes, each initialized once
+"""
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Dict, List
+
+
+LOG_NAME = "launch.log"
+DONE, FAILED = "done", "failed"
+
+
+def expand_run_folders(patterns: List[str]) -> List[str]:
+    """Absolute paths of the folders matching each pattern (a folder or a glob), in the order given without duplicates
+
+    Raises:
+        ValueError: If a pattern matches no folder
+    """
+    run_folders: Dict[str, None] = {}
+    for pattern in patterns:
+        matches = sorted(path for path in glob.glob(os.path.expanduser(pattern)) if os.path.isdir(path))
+        if len(matches) == 0:
+            raise ValueError(f"{pattern} matches no run folder")
+        for path in matches:
+            run_folders[os.path.abspath(path)] = None
+    return list(run_folders)
+
+
+def _initialize_worker(offline: bool = False) -> None:
+    from bifrost_run_launcher import launcher
+    if offline:
+        launcher.initialize_offline()
+    else:
+        launcher.initialize() # component and DB connection shared by every run the worker launches
+
+
+def launch_run_folder(run_folder: str, launcher_args: List[str]) -> Dict:
+    """Launches one run folder with the initialized component, the output of the launch goes to launch.log in the run folder
+
+    Returns:
+        Dict: run_folder, status (done or failed), samples in the run, seconds and the error of a failed launch
+    """
+    from bifrost_run_launcher import launcher
+    from bifrost_run_launcher import pipeline
+    result = {"run_folder": run_folder, "status": DONE, "samples": None, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    with open(os.path.join(run_folder, LOG_NAME), "w") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            run = pipeline.run_pipeline(launcher.parse_pipeline_options(launcher.run_folder_arguments(run_folder) + launcher_args))
+            result["samples"] = len(run.samples)
+        except (Exception, SystemExit) as error: # argparse exits on invalid options, e.g. a missing run_metadata.tsv
+            traceback.print_exc()
+            result["status"] = FAILED
+            result["error"] = f"{type(error).__name__}: {error}"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def format_summary(results: List[Dict]) -> str:
+    """Table of the runs with their status, samples, time and error"""
+    rows = [("run", "status", "samples", "seconds", "error")]
+    for result in results:
+        rows.append((os.path.basename(result["run_folder"]), result["status"],
+                     "" if result["samples"] is None else str(result["samples"]), f"{result['seconds']:.1f}", result["error"] or ""))
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    lines = ["  ".join(value.ljust(width) for value, width in zip(row, widths)) + "  " + row[-1] for row in rows]
+    failed = sum(result["status"] != DONE for result in results)
+    lines.append(f"{len(results) - failed} of {len(results)} runs launched, {failed} failed")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def run_batch(patterns: List[str], launcher_args: List[str], workers: int = 1) -> List[Dict]:
+    """Launches every run folder matching patterns and prints a summary table
+
+    Note:
+        With one worker the runs are launched one after the other in this process, with the component and
+        DB connection the launcher already initialized. With more workers every worker process is started
+        (spawned, as the DB client can't be shared over a fork) and initialized once and then launches runs
+        until none are left, with --plan in launcher_args the workers don't connect to the DB. A failing
+        run doesn't stop the others.
+
+    Args:
+        patterns (List[str]): run folders or glob patterns of run folders
+        launcher_args (List[str]): launcher arguments used for every run, e.g. --component_subset
+        workers (int, optional): number of worker processes. Defaults to 1.
+
+    Returns:
+        List[Dict]: result of each run in the order of the run folders, see launch_run_folder
+    """
+    run_folders = expand_run_folders(patterns)
+    print(f"Launching {len(run_folders)} runs with {workers} workers")
+    results: Dict[str, Dict] = {}
+    if workers <= 1:
+        for run_folder in run_folders:
+            results[run_folder] = launch_run_folder(run_folder, launcher_args)
+            print(f"{results[run_folder]['status']}: {run_folder}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_initialize_worker, initargs=("--plan" in launcher_args,)) as pool:
+            futures = {pool.submit(launch_run_folder, run_folder, launcher_args): run_folder for run_folder in run_folders}
+            for future in as_completed(futures):
+                run_folder = futures[future]
+                try:
+                    results[run_folder] = future.result()
+                except Exception as error: # worker died, e.g. failed to initialize
+                    results[run_folder] = {"run_folder": run_folder, "status": FAILED, "samples": None, "seconds": 0.0, "error": f"{type(error).__name__}: {error}"}
+                print(f"{results[run_folder]['status']}: {run_folder}")
+    ordered_results = [results[run_folder] for run_folder in run_folders]
+    print(format_summary(ordered_results))
+    return ordered_results
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Watches a folder of run folders and launches each run once it has finished copying
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+
+QUEUE_NAME = ".bifrost_run_launcher_queue.json"
+DEFAULT_MARKERS = ["CopyComplete.txt", "RTAComplete.txt", "launch_ready"]
+DEFAULT_METADATA = "run_metadata.tsv"
+# states of a run in the queue, queued and running runs are launched again after a restart
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# states in which a launch may have saved part of the run, it is resumed with --re_run instead of launched as a new run
+STARTED = {RUNNING, FAILED}
+
+
+class RunQueue:
+    """State of every run folder the daemon has seen, saved to a JSON file on each change"""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.runs: Dict[str, Dict] = {}
+        if os.path.isfile(path):
+            with open(path, "r") as fh:
+                self.runs = json.load(fh)
+
+    def _save(self) -> None:
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as fh:
+            json.dump(self.runs, fh, indent=2)
+        os.replace(temp_path, self.path) # a crash while writing leaves the previous queue
+
+    def set_state(self, run_folder: str, state: str, error: Optional[str] = None, resume: bool = False) -> None:
+        with self.lock:
+            self.runs[run_folder] = {"state": state, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "error": error, "resume": resume}
+            self._save()
+
+    def state(self, run_folder: str) -> Optional[str]:
+        with self.lock:
+            return self.runs.get(run_folder, {}).get("state", None)
+
+    def pending(self, retry_failed: bool = False) -> List[Tuple[str, bool]]:
+        """Runs to launch after a restart, the ones queued or interrupted while running, with whether an earlier launch started"""
+        states = {QUEUED, RUNNING, FAILED} if retry_failed else {QUEUED, RUNNING}
+        with self.lock:
+            return [(run_folder, run["state"] in STARTED or run.get("resume", False)) for run_folder, run in self.runs.items() if run["state"] in states]
+
+
+class Daemon:
+    """Launches the run folders in root that are ready, with at most workers launches at a time
+
+    Note:
+        A run folder is ready when one of the markers exists and the metadata file has kept the same size
+        and modification time for settle seconds. Every run folder is launched once, the state of each is
+        kept in the queue file in root so runs queued or running when the daemon stopped are launched again
+        on the next start. launch is called with the run folder and whether an earlier launch of it started,
+        so a run interrupted or failed part way is resumed instead of saved again as a new run.
+    """
+    def __init__(self, root: str, launch: Callable[[str, bool], None], workers: int = 1, settle: float = 60,
+                 markers: List[str] = DEFAULT_MARKERS, metadata_name: str = DEFAULT_METADATA, retry_failed: bool = False) -> None:
+        self.root = os.path.abspath(root)
+        self.launch = launch
+        self.settle = settle
+        self.markers = markers
+        self.metadata_name = metadata_name
+        self.queue = RunQueue(os.path.join(self.root, QUEUE_NAME))
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures: Dict[str, Future] = {}
+        self.seen: Dict[str, Tuple[Tuple[int, int], float]] = {} # metadata signature and when it was first seen
+        self.touched: Set[str] = set()
+        self.touched_lock = threading.Lock()
+        for run_folder, resume in self.queue.pending(retry_failed):
+            self.submit(run_folder, resume)
+
+    def touch(self, path: str) -> None:
+        """Marks the run folder holding path for a readiness check, called by the file watcher"""
+        relative_path = os.path.relpath(os.path.abspath(path), self.root)
+        if relative_path.startswith("."): # outside root, root itself or the queue file
+            return
+        with self.touched_lock:
+            self.touched.add(relative_path.split(os.sep)[0])
+
+    def is_ready(self, run_folder: str, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        folder = os.path.join(self.root, run_folder)
+        if not any(os.path.isfile(os.path.join(folder, marker)) for marker in self.markers):
+            return False
+        try:
+            stat = os.stat(os.path.join(folder, self.metadata_name))
+        except OSError:
+            return False
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if run_folder not in self.seen or self.seen[run_folder][0] != signature: # changed, wait for it to settle
+            self.seen[run_folder] = (signature, now)
+            return self.settle <= 0
+        return now - self.seen[run_folder][1] >= self.settle
+
+    def submit(self, run_folder: str, resume: bool = False) -> None:
+        self.queue.set_state(run_folder, QUEUED, resume=resume)
+        self.futures[run_folder] = self.pool.submit(self._launch, run_folder, resume)
+
+    def _launch(self, run_folder: str, resume: bool = False) -> None:
+        self.queue.set_state(run_folder, RUNNING)
+        print(f"{'Resuming' if resume else 'Launching'} {run_folder}")
+        try:
+            self.launch(os.path.join(self.root, run_folder), resume)
+        except (Exception, SystemExit): # argparse exits on invalid options, e.g. a missing run metadata file
+            print(traceback.format_exc(), file=sys.stderr)
+            self.queue.set_state(run_folder, FAILED, traceback.format_exc(limit=1))
+        else:
+            self.queue.set_state(run_folder, DONE)
+            print(f"Done {run_folder}")
+
+    def check(self, candidates: Optional[Set[str]] = None, now: Optional[float] = None) -> List[str]:
+        """Submits the candidate run folders (all folders in root when None) that are ready and not launched yet"""
+        if candidates is None:
+            with os.scandir(self.root) as scan:
+                candidates = {entry.name for entry in scan if entry.is_dir() and not entry.name.startswith(".")}
+        submitted = []
+        for run_folder in sorted(candidates):
+            if self.queue.state(run_folder) is None and self.is_ready(run_folder, now):
+                self.submit(run_folder)
+                submitted.append(run_folder)
+        return submitted
+
+    def run(self, poll: float = 10, use_watcher: bool = True) -> None:
+        """Checks for ready runs every poll seconds until interrupted
+
+        Note:
+            With watchdog installed only folders with file events (and folders still settling) are checked,
+            without it every folder in root is checked each time.
+        """
+        observer = self._start_observer() if use_watcher else None
+        candidates: Optional[Set[str]] = None # all folders on the first check
+        try:
+            while True:
+                self.check(candidates)
+                time.sleep(poll)
+                if observer is not None:
+                    with self.touched_lock:
+                        candidates, self.touched = self.touched, set()
+                    candidates |= {run_folder for run_folder in self.seen if self.queue.state(run_folder) is None}
+        except KeyboardInterrupt:
+            print("Stopping, queued runs are launched on the next start")
+        finally:
+            if observer is not None:
+                observer.stop()
+            self.stop()
+
+    def stop(self) -> None:
+        """Waits for the running launches, queued launches are cancelled and stay queued for the next start"""
+        for future in self.futures.values():
+            future.cancel() # cancel_futures of shutdown needs Python 3.9
+        self.pool.shutdown(wait=True)
+
+    def _start_observer(self) -> Optional[object]:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print("watchdog not installed, polling the folder instead", file=sys.stderr)
+            return None
+        daemon = self
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                daemon.touch(event.src_path)
+                if getattr(event, "dest_path", None):
+                    daemon.touch(event.dest_path)
+        observer = Observer()
+        observer.schedule(Handler(), self.root, recursive=True)
+        observer.start()
+        return observer
+
+
+def launch_run_folder(run_folder: str, launcher_args: List[str], resume: bool = False) -> None:
+    """Runs the pipeline on a run folder with the already initialized component and DB connection
+
+    Note:
+        The run folder is the output directory and run name, its metadata file and reads folder are used
+        unless given in launcher_args, see launcher.run_folder_arguments. With resume the run is launched
+        with --re_run, reusing the run and samples an earlier launch saved.
+    """
+    from bifrost_run_launcher import launcher
+    from bifrost_run_launcher import pipeline
+    resume_args = ["--re_run"] if resume else []
+    pipeline.run_pipeline(launcher.parse_pipeline_options(launcher.run_folder_arguments(run_folder, DEFAULT_METADATA) + resume_args + launcher_args))
+
+
+def main(args: List[str] = sys.argv[1:]) -> None:
+    parser = argparse.ArgumentParser(description="Launches the run folders in a folder as they finish copying, other arguments are passed to the launcher")
+    parser.add_argument(
+        'root',
+        help='Folder with a run folder per run'
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        help='Number of runs launched at a time'
+    )
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=60,
+        help='Seconds the run metadata must stay unchanged before the run is launched'
+    )
+    parser.add_argument(
+        '--poll',
+        type=float,
+        default=10,
+        help='Seconds between checks for ready runs'
+    )
+    parser.add_argument(
+        '--markers',
+        default=",".join(DEFAULT_MARKERS),
+        help='Files of which one marks a run folder as completely copied. Use a comma for separation'
+    )
+    parser.add_argument(
+        '--retry_failed',
+        action='store_true',
+        help='Launch runs that failed before the restart again'
+    )
+    options, launcher_args = parser.parse_known_args(args)
+
+    from bifrost_run_launcher import launcher
+    launcher.initialize() # component, imports and DB pool are shared by every launch
+    daemon = Daemon(options.root, lambda run_folder, resume: launch_run_folder(run_folder, launcher_args, resume), options.workers,
+                    options.settle, options.markers.split(","), retry_failed=options.retry_failed)
+    print(f"Watching {daemon.root}")
+    daemon.run(options.poll)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Single MongoDB connection for the launcher, shared with bifrostlib so every load/save goes through one pooled client
+"""
+import os
+import sys
+import time
+from typing import Any, Callable
+from bifrostlib import database_interface
+from bifrost_run_launcher import instrumentation
+from pymongo import MongoClient, monitoring
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError
+
+
+# Defaults can be overridden with the env vars of the same name
+BIFROST_DB_POOL_SIZE = 10
+BIFROST_DB_TIMEOUT_MS = 30000
+BIFROST_DB_RETRIES = 3
+TRANSIENT_ERRORS = (AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts every command the client sends as a db_round_trips of the launch in the thread sending it
+
+    Note:
+        Counting in the driver includes the commands bifrostlib sends on its own, e.g. the
+        list_collection_names before each Run load/save, and every retry of a command.
+    """
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        instrumentation.count("db_round_trips")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+def _setting(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def connect() -> MongoClient:
+    """Get the shared connection, creating it on first use
+
+    Note:
+        The client is stored as bifrostlib's database_interface.CONNECTION, so Run/Sample/Component load and
+        save reuse the same pool instead of opening their own. Pool size and timeouts come from
+        BIFROST_DB_POOL_SIZE and BIFROST_DB_TIMEOUT_MS. Commands sent are counted by RoundTripCounter.
+
+    Returns:
+        MongoClient: the shared client
+
+    Raises:
+        ValueError: If BIFROST_DB_KEY is not set
+    """
+    if database_interface.CONNECTION is None:
+        if os.environ.get("BIFROST_DB_KEY", None) is None:
+            raise ValueError("BIFROST_DB_KEY not set")
+        timeout_ms = _setting("BIFROST_DB_TIMEOUT_MS", BIFROST_DB_TIMEOUT_MS)
+        database_interface.CONNECTION = MongoClient(
+            os.environ["BIFROST_DB_KEY"],
+            maxPoolSize=_setting("BIFROST_DB_POOL_SIZE", BIFROST_DB_POOL_SIZE),
+            serverSelectionTimeoutMS=timeout_ms,
+            connectTimeoutMS=timeout_ms,
+            socketTimeoutMS=timeout_ms,
+            retryWrites=True,
+            retryReads=True,
+            event_listeners=[RoundTripCounter()]
+        )
+    return database_interface.CONNECTION
+
+
+def get_database() -> Database:
+    return connect().get_database()
+
+
+def get_collection(object_type: str) -> Collection:
+    """Get the collection of a bifrost object type e.g. sample -> samples"""
+    return get_database()[database_interface.pluralize(object_type)]
+
+
+def with_retry(function: Callable, *args, **kwargs) -> Any:
+    """Calls function, retrying with exponential backoff on transient connection errors
+
+    Note:
+        Only use for reads and idempotent writes, BIFROST_DB_RETRIES sets the number of retries.
+    """
+    retries = _setting("BIFROST_DB_RETRIES", BIFROST_DB_RETRIES)
+    for attempt in range(retries + 1):
+        try:
+            return function(*args, **kwargs)
+        except TRANSIENT_ERRORS as error:
+            if attempt == retries:
+                raise
+            print(f"Transient DB error, retrying ({attempt + 1}/{retries}): {error}", file=sys.stderr)
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def name_exists(object_type: str, name: str) -> bool:
+    """Checks if an object with the name exists without loading any matching documents"""
+    return with_retry(get_collection(object_type).count_documents, {"name": name}, limit=1) > 0
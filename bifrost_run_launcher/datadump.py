@@ -1 +1,189 @@
-#TODO: Add datadump
\ No newline at end of file
+#!/usr/bin/env python3
+"""
+Exports a run and all its samples from the DB as NDJSON or Parquet, streaming the samples from one cursor
+"""
+import argparse
+import os
+import sys
+from typing import Any, Dict, IO, Iterator, List, Optional
+from bson import ObjectId, json_util
+from bifrost_run_launcher import database
+
+
+DEFAULT_BATCH_SIZE = 500
+# fields exported by default, a field holding an object is exported whole (as a JSON string in Parquet)
+DEFAULT_FIELDS = [
+    "_id",
+    "name",
+    "display_name",
+    "run",
+    "categories.sample_info.summary",
+    "categories.paired_reads.summary",
+    "categories.events.summary",
+    "categories.species_detection.summary",
+    "metadata",
+]
+FORMATS = ["ndjson", "parquet"]
+
+
+def load_run(name: Optional[str] = None, _id: Optional[str] = None) -> Optional[Dict]:
+    """Loads the run document by _id or name, the latest run when several have the name"""
+    query = {"_id": ObjectId(_id)} if _id is not None else {"name": name}
+    documents = database.with_retry(lambda: list(database.get_collection("run").find(query).sort("_id", -1).limit(1)))
+    return documents[0] if documents else None
+
+
+def iter_samples(run: Dict, fields: Optional[List[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict]:
+    """Yields the samples of the run from one cursor, batch_size documents are fetched per round-trip
+
+    Note:
+        Samples come in the order of the DB, not the order of run.samples. References without an _id
+        are matched on name.
+    """
+    ids = []
+    names = []
+    for sample_reference in run.get("samples", []):
+        if sample_reference.get("_id", None) is not None:
+            ids.append(sample_reference["_id"])
+        elif sample_reference.get("name", None) is not None:
+            names.append(sample_reference["name"])
+    if len(ids) == 0 and len(names) == 0:
+        return
+    projection = {field: 1 for field in fields} if fields is not None else None
+    cursor = database.get_collection("sample").find({"$or": [{"_id": {"$in": ids}}, {"name": {"$in": names}}]}, projection, batch_size=batch_size)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+
+def get_field(document: Dict, field: str) -> Any:
+    value = document
+    for key in field.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _to_json(document: Any) -> str:
+    return json_util.dumps(document) # the extended JSON bifrostlib's bson_to_json gives
+
+
+def write_ndjson(samples: Iterator[Dict], fh: IO) -> int:
+    """Writes one sample per line in the extended JSON of bifrostlib ({"$oid": ..}, {"$date": ..})"""
+    count = 0
+    for sample in samples:
+        fh.write(_to_json(sample) + "\n")
+        count += 1
+    return count
+
+
+def write_parquet(samples: Iterator[Dict], path: str, fields: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Writes a column per field and a row per sample, batch_size rows per row group
+
+    Note:
+        Every column is a string so the schema is the same for every batch: _id as the hex id, strings as is
+        and anything else (numbers, objects, lists) as JSON. Missing fields are null. Needs pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(field, pa.string()) for field in fields])
+
+    def value_to_string(value: Any) -> Optional[str]:
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, ObjectId):
+            return str(value)
+        return _to_json(value)
+
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        columns: Dict[str, List] = {field: [] for field in fields}
+        for sample in samples:
+            for field in fields:
+                columns[field].append(value_to_string(get_field(sample, field)))
+            count += 1
+            if count % batch_size == 0:
+                writer.write_table(pa.table(columns, schema=schema))
+                columns = {field: [] for field in fields}
+        if len(columns[fields[0]]) > 0:
+            writer.write_table(pa.table(columns, schema=schema))
+    return count
+
+
+def dump_run(run: Dict, out_prefix: str, output_format: str = "ndjson", fields: Optional[List[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, str]:
+    """Writes the run document to <out_prefix>_run.json and its samples to <out_prefix>_samples.<format>
+
+    Args:
+        run (Dict): run document as in the DB
+        out_prefix (str): path prefix of the output files
+        output_format (str, optional): ndjson or parquet. Defaults to "ndjson".
+        fields (List[str], optional): sample fields to export, None exports all fields to NDJSON and DEFAULT_FIELDS to Parquet. Defaults to None.
+        batch_size (int, optional): samples fetched per round-trip and rows per Parquet row group. Defaults to DEFAULT_BATCH_SIZE.
+
+    Returns:
+        Dict[str, str]: paths of the run and samples output
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format {output_format}, options are {', '.join(FORMATS)}")
+    paths = {"run": f"{out_prefix}_run.json", "samples": f"{out_prefix}_samples.{output_format}"}
+    with open(paths["run"], "w") as fh:
+        fh.write(_to_json(run) + "\n")
+    if output_format == "parquet":
+        fields = fields or DEFAULT_FIELDS
+        count = write_parquet(iter_samples(run, fields, batch_size), paths["samples"], fields, batch_size)
+    else:
+        with open(paths["samples"], "w") as fh:
+            count = write_ndjson(iter_samples(run, fields, batch_size), fh)
+    print(f"Exported run {run['name']} and {count} of its {len(run.get('samples', []))} samples to {paths['samples']}")
+    return paths
+
+
+def main(args: List[str] = sys.argv[1:]) -> None:
+    parser = argparse.ArgumentParser(description="Exports a run and its samples from the bifrost DB, BIFROST_DB_KEY sets the DB")
+    parser.add_argument(
+        '-name', '--run_name',
+        default=None,
+        help='Name of the run, the latest run with the name is exported'
+    )
+    parser.add_argument(
+        '-id', '--run_id',
+        default=None,
+        help='_id of the run, used instead of the name'
+    )
+    parser.add_argument(
+        '-out', '--out_prefix',
+        default=None,
+        help='Output path prefix, defaults to the run name in the current directory'
+    )
+    parser.add_argument(
+        '--format',
+        choices=FORMATS,
+        default="ndjson",
+        help='Format of the samples output, parquet needs pyarrow'
+    )
+    parser.add_argument(
+        '--fields',
+        default=None,
+        help='Sample fields to export, dotted paths separated by comma. Defaults to all fields for ndjson and a summary for parquet'
+    )
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help='Samples fetched per DB round-trip'
+    )
+    options = parser.parse_args(args)
+    if options.run_name is None and options.run_id is None:
+        parser.error("one of --run_name or --run_id is required")
+    run = load_run(options.run_name, options.run_id)
+    if run is None:
+        print(f"Run {options.run_id or options.run_name} not in DB", file=sys.stderr)
+        sys.exit(1)
+    out_prefix = options.out_prefix or os.path.join(os.getcwd(), run["name"])
+    dump_run(run, out_prefix, options.format, options.fields.split(",") if options.fields else None, options.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Sharded run scripts (one script per sample or per N samples) with a manifest and a bounded local executor
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+
+SHARD_FOLDER = "shards"
+MANIFEST_NAME = "manifest.tsv"
+STATUS_NAME = "status.tsv"
+PRE_SCRIPT_NAME = "pre.sh"
+POST_SCRIPT_NAME = "post.sh"
+
+
+def exit_file(script: str) -> str:
+    return script + ".exit"
+
+
+def log_file(script: str) -> str:
+    return script + ".log"
+
+
+def sample_status_file(script: str) -> str:
+    return script + ".samples"
+
+
+def _temp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" # unique per writer, so concurrent launches don't share it
+
+
+@contextmanager
+def open_atomic(path: str, buffering: int = -1) -> Iterator[IO]:
+    """Opens a temp file next to path for writing, it replaces path only when the with block completes
+
+    Note:
+        A failure while writing, e.g. a sample that can't be rendered, leaves the previous file at path as it was.
+    """
+    temp_path = _temp_path(path)
+    try:
+        with open(temp_path, "w", buffering=buffering) as fh:
+            yield fh
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _shard_script(script_path: str, blocks: List[Tuple[str, str]]) -> str:
+    """Script running each block in a subshell with set -eo pipefail, so a failing command fails its sample
+
+    Note:
+        The exit status of each block is written to <script>.samples and the script exits with the first
+        non-zero one. The trap records the exit status also when the shards are run with GNU parallel or
+        xargs instead of --execute.
+    """
+    lines = [
+        "#!/usr/bin/env bash",
+        f"trap 'echo $? > \"{exit_file(script_path)}\"' EXIT",
+        f": > \"{sample_status_file(script_path)}\"",
+        "shard_status=0",
+    ]
+    for name, block in blocks:
+        lines += [
+            "(",
+            "set -eo pipefail",
+            block.rstrip("\n"),
+            ")",
+            "block_status=$?",
+            f"printf '%s\\t%s\\n' {shlex.quote(name)} $block_status >> \"{sample_status_file(script_path)}\"",
+            "if [ $shard_status -eq 0 ]; then shard_status=$block_status; fi",
+        ]
+    lines.append("exit $shard_status")
+    return "\n".join(lines) + "\n"
+
+
+def write_shards(outdir: str, sample_blocks: Iterable[Tuple[str, str]], pre_script: Optional[str] = None, post_script: Optional[str] = None, samples_per_shard: int = 1) -> str:
+    """Writes the per sample blocks into shard scripts and a manifest of them
+
+    Note:
+        The manifest has a line per shard with the script path (relative to outdir) and the comma separated
+        sample names. Shards are independent of each other, they can be run with execute_manifest or e.g.
+        `cut -f1 shards/manifest.tsv | xargs -P 32 -n 1 bash` from outdir. The pre and post scripts are
+        written as shards/pre.sh and shards/post.sh to be run before and after all shards.
+
+    Args:
+        outdir (str): output directory of the run, the shards are written to outdir/shards
+        sample_blocks (Iterable[Tuple[str, str]]): sample name and rendered per sample script in run order
+        pre_script (str, optional): rendered pre script. Defaults to None.
+        post_script (str, optional): rendered post script. Defaults to None.
+        samples_per_shard (int, optional): samples per shard script. Defaults to 1.
+
+    Returns:
+        str: path of the manifest
+    """
+    if samples_per_shard < 1:
+        raise ValueError(f"samples_per_shard must be at least 1, got {samples_per_shard}")
+    shard_folder = os.path.join(os.path.abspath(outdir), SHARD_FOLDER)
+    os.makedirs(shard_folder, exist_ok=True)
+
+    # shards are written to temp files and only replace the previous ones once every block has been rendered
+    rendered: List[str] = []
+    manifest: List[str] = []
+    shard: List[Tuple[str, str]] = []
+    def write_shard() -> None:
+        script_name = f"shard_{len(manifest):05d}.sh"
+        script_path = os.path.join(shard_folder, script_name)
+        with open(_temp_path(script_path), "w") as fh:
+            fh.write(_shard_script(script_path, shard))
+        rendered.append(script_path)
+        manifest.append(f"{SHARD_FOLDER}/{script_name}\t{','.join(sample_name for sample_name, block in shard)}\n")
+        shard.clear()
+
+    try:
+        for sample_name, block in sample_blocks:
+            shard.append((sample_name, block))
+            if len(shard) == samples_per_shard:
+                write_shard()
+        if len(shard) > 0:
+            write_shard()
+    except BaseException:
+        for script_path in rendered:
+            os.remove(_temp_path(script_path))
+        raise
+
+    for script_name, script in ((PRE_SCRIPT_NAME, pre_script), (POST_SCRIPT_NAME, post_script)):
+        script_path = os.path.join(shard_folder, script_name)
+        if script is not None:
+            with open_atomic(script_path) as fh:
+                fh.write(_shard_script(script_path, [(script_name, script)]))
+        elif os.path.isfile(script_path):
+            os.remove(script_path)
+    for script_path in rendered:
+        os.replace(_temp_path(script_path), script_path)
+        for result_path in (exit_file(script_path), sample_status_file(script_path)): # a relaunch makes new scripts that have not run yet
+            if os.path.isfile(result_path):
+                os.remove(result_path)
+    manifest_path = os.path.join(shard_folder, MANIFEST_NAME)
+    with open_atomic(manifest_path) as fh:
+        fh.writelines(manifest)
+    _remove_stale_shards(shard_folder, {os.path.basename(script_path) for script_path in rendered})
+    return manifest_path
+
+
+def _remove_stale_shards(shard_folder: str, script_names: Iterable[str]) -> None:
+    """Removes the shard scripts of an earlier launch with more shards and their results, so a glob of the shards only finds the current ones"""
+    current = {name for script_name in script_names for name in (script_name, exit_file(script_name), log_file(script_name), sample_status_file(script_name))}
+    for name in os.listdir(shard_folder):
+        if name.startswith("shard_") and not name.endswith(".tmp") and name not in current:
+            os.remove(os.path.join(shard_folder, name))
+
+
+def read_manifest(manifest_path: str) -> List[Tuple[str, List[str]]]:
+    """Returns the shard script paths (relative to the run output directory) and their sample names"""
+    shards = []
+    with open(manifest_path, "r") as fh:
+        for line in fh:
+            script, sample_names = line.rstrip("\n").split("\t")
+            shards.append((script, sample_names.split(",") if sample_names else []))
+    return shards
+
+
+def read_exit_status(script_path: str) -> Optional[int]:
+    """Exit status of the last run of a script, None if it hasn't finished"""
+    try:
+        with open(exit_file(script_path), "r") as fh:
+            return int(fh.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def read_sample_status(script_path: str) -> Dict[str, int]:
+    """Exit status of each sample of the last run of a shard, samples that didn't finish are left out"""
+    sample_status: Dict[str, int] = {}
+    try:
+        with open(sample_status_file(script_path), "r") as fh:
+            for line in fh:
+                sample_name, status = line.rstrip("\n").split("\t")
+                sample_status[sample_name] = int(status)
+    except (OSError, ValueError):
+        pass
+    return sample_status
+
+
+def run_script(script_path: str, cwd: str) -> int:
+    """Runs a script with bash from cwd, output goes to <script>.log and the exit status to <script>.exit"""
+    with open(log_file(script_path), "w") as log:
+        returncode = subprocess.run(["bash", script_path], cwd=cwd, stdout=log, stderr=subprocess.STDOUT).returncode
+    with open(exit_file(script_path), "w") as fh:
+        fh.write(f"{returncode}\n")
+    return returncode
+
+
+def execute_manifest(outdir: str, jobs: Optional[int] = None, retry: bool = True) -> Dict[str, int]:
+    """Runs the pre script, the shards of the manifest with at most jobs at a time and then the post script
+
+    Note:
+        Scripts are run from outdir like `bash run_script.sh` is. Shards that already exited with 0 are skipped,
+        so running again only retries the failed or unfinished ones. The post script is only run when all
+        shards succeeded. The exit status of every sample is written to shards/status.tsv.
+
+    Args:
+        outdir (str): output directory of the run with the shards folder
+        jobs (int, optional): maximum number of shards running at a time. Defaults to None (cpu count).
+        retry (bool, optional): skip shards that already succeeded. Defaults to True.
+
+    Returns:
+        Dict[str, int]: sample name to its exit status
+    """
+    outdir = os.path.abspath(outdir)
+    shard_folder = os.path.join(outdir, SHARD_FOLDER)
+    shards = read_manifest(os.path.join(shard_folder, MANIFEST_NAME))
+
+    pre_script_path = os.path.join(shard_folder, PRE_SCRIPT_NAME)
+    if os.path.isfile(pre_script_path) and not (retry and read_exit_status(pre_script_path) == 0):
+        if run_script(pre_script_path, outdir) != 0:
+            print(f"Pre script failed, see {log_file(pre_script_path)}", file=sys.stderr)
+            return {}
+
+    exit_status: Dict[str, int] = {}
+    to_run = []
+    for script, sample_names in shards:
+        script_path = os.path.join(outdir, script)
+        if retry and read_exit_status(script_path) == 0:
+            exit_status[script] = 0
+        else:
+            to_run.append(script)
+    print(f"Running {len(to_run)} of {len(shards)} shards with {jobs or os.cpu_count()} jobs")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for script, returncode in zip(to_run, executor.map(lambda script: run_script(os.path.join(outdir, script), outdir), to_run)):
+            exit_status[script] = returncode
+            if returncode != 0:
+                print(f"{script} failed with exit status {returncode}, see {log_file(os.path.join(outdir, script))}", file=sys.stderr)
+
+    sample_status: Dict[str, int] = {}
+    with open(os.path.join(shard_folder, STATUS_NAME), "w") as fh:
+        for script, sample_names in shards:
+            shard_sample_status = read_sample_status(os.path.join(outdir, script))
+            for sample_name in sample_names:
+                # a sample the shard didn't get to, e.g. when it was killed, gets the status of the shard
+                sample_status[sample_name] = shard_sample_status.get(sample_name, exit_status[script])
+                fh.write(f"{sample_name}\t{script}\t{sample_status[sample_name]}\n")
+
+    failed = [script for script, sample_names in shards if exit_status[script] != 0]
+    post_script_path = os.path.join(shard_folder, POST_SCRIPT_NAME)
+    if len(failed) > 0:
+        print(f"{len(failed)} shards failed, run again to retry them", file=sys.stderr)
+    elif os.path.isfile(post_script_path):
+        if run_script(post_script_path, outdir) != 0:
+            print(f"Post script failed, see {log_file(post_script_path)}", file=sys.stderr)
+    return sample_status
+
+
+def main(args: List[str] = sys.argv[1:]) -> None:
+    parser = argparse.ArgumentParser(description="Runs or retries the shards of a launched run")
+    parser.add_argument(
+        '-out', '--outdir',
+        default=os.getcwd(),
+        help='Output directory of the run'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='Number of shards running at a time, defaults to the number of CPUs'
+    )
+    parser.add_argument(
+        '--all',
+        action='store_true',
+        help='Also run shards that already succeeded'
+    )
+    options = parser.parse_args(args)
+    sample_status = execute_manifest(options.outdir, options.jobs, retry=not options.all)
+    sys.exit(0 if all(status == 0 for status in sample_status.values()) and len(sample_status) > 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of facts derived from files (read counts) so relaunching a run doesn't re-read unchanged files
+"""
+import os
+import json
+import time
+import sqlite3
+from typing import Any, Optional, Tuple
+
+
+DEFAULT_CACHE_NAME = "file_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class FileCache:
+    """SQLite backed cache keyed by absolute path, size, mtime and inode
+
+    Note:
+        A cached value is only returned while the file has the same size, mtime and inode as when it was
+        stored, any change to the file invalidates it. The least recently used entries are evicted when the
+        cache grows past max_entries.
+    """
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        """Initialization
+
+        Args:
+            path (str): location of the sqlite file, created if missing
+            max_entries (int, optional): entries kept after eviction. Defaults to DEFAULT_MAX_ENTRIES.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_facts ("
+            "path TEXT NOT NULL, fact TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL, "
+            "value TEXT NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (path, fact))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS file_facts_last_used ON file_facts (last_used)")
+
+    def __enter__(self) -> "FileCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[str, int, int, int]:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def _lookup(self, path: str, signature: Optional[Tuple[int, int, int]]) -> Tuple[str, int, int, int]:
+        if signature is None:
+            return self._signature(path)
+        return (os.path.abspath(path),) + tuple(signature)
+
+    def get(self, path: str, fact: str, signature: Optional[Tuple[int, int, int]] = None) -> Optional[Any]:
+        """Get a cached fact for a file
+
+        Args:
+            path (str): file path
+            fact (str): name of the fact e.g. "reads"
+            signature (Tuple[int, int, int], optional): (size, mtime_ns, inode) if already stat'd. Defaults to None which stats the file.
+
+        Returns:
+            Any: the stored value, None if missing or the file changed since it was stored
+        """
+        try:
+            abspath, size, mtime_ns, inode = self._lookup(path, signature)
+        except OSError:
+            return None
+        row = self.connection.execute(
+            "SELECT value FROM file_facts WHERE path = ? AND fact = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+            (abspath, fact, size, mtime_ns, inode)
+        ).fetchone()
+        if row is None:
+            return None
+        self.connection.execute("UPDATE file_facts SET last_used = ? WHERE path = ? AND fact = ?", (time.time(), abspath, fact))
+        return json.loads(row[0])
+
+    def set(self, path: str, fact: str, value: Any, signature: Optional[Tuple[int, int, int]] = None) -> None:
+        """Store a fact for a file against its current size, mtime and inode
+
+        Args:
+            path (str): file path
+            fact (str): name of the fact e.g. "reads"
+            value (Any): json serializable value
+            signature (Tuple[int, int, int], optional): (size, mtime_ns, inode) if already stat'd. Defaults to None which stats the file.
+        """
+        try:
+            abspath, size, mtime_ns, inode = self._lookup(path, signature)
+        except OSError:
+            return
+        self.connection.execute(
+            "INSERT OR REPLACE INTO file_facts (path, fact, size, mtime_ns, inode, value, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (abspath, fact, size, mtime_ns, inode, json.dumps(value), time.time())
+        )
+
+    def evict(self) -> int:
+        """Removes the least recently used entries above max_entries
+
+        Returns:
+            int: number of removed entries
+        """
+        cursor = self.connection.execute(
+            "DELETE FROM file_facts WHERE rowid IN (SELECT rowid FROM file_facts ORDER BY last_used DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Evicts, commits and closes the cache"""
+        if self.connection is not None:
+            self.evict()
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
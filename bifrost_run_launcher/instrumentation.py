@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Per phase timings and counters of a launch, written as launch_report.json and stored on the run
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+
+REPORT_NAME = "launch_report.json"
+PROFILE_NAME = "launch.prof"
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident set size of the process so far in KiB, None where it can't be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # bytes on macOS, KiB on Linux
+
+
+class Instrumentation:
+    """Wall time per phase and counters of one launch
+
+    Note:
+        Time spent in a phase that is entered more than once is summed. Phases can be nested,
+        the outer phase then includes the time of the inner ones. The RSS is only available as the
+        peak of the whole process, so per phase the growth of that peak during the phase is recorded,
+        a phase that stays below an earlier peak shows no growth whatever it allocates.
+    """
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self.peak_rss_growth_kb: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock() # counters are also updated from the threads a launch hands work to
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        start_peak = peak_rss_kb()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+            if start_peak is not None:
+                self.peak_rss_growth_kb[name] = self.peak_rss_growth_kb.get(name, 0) + peak_rss_kb() - start_peak
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> Dict:
+        return {
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "peak_rss_growth_kb": dict(self.peak_rss_growth_kb),
+            "process_peak_rss_kb": peak_rss_kb(),
+            "counters": dict(self.counters),
+        }
+
+    def write(self, path: str = REPORT_NAME) -> Dict:
+        report = self.report()
+        with open(path, "w") as fh:
+            json.dump(report, fh, indent=2)
+        return report
+
+
+# instrumentation of the current launch of each thread, so launches in threads of one process don't mix
+_LOCAL = threading.local()
+
+
+def current() -> Instrumentation:
+    if not hasattr(_LOCAL, "instrumentation"):
+        _LOCAL.instrumentation = Instrumentation()
+    return _LOCAL.instrumentation
+
+
+def reset() -> Instrumentation:
+    """Starts a new launch in the calling thread"""
+    _LOCAL.instrumentation = Instrumentation()
+    return _LOCAL.instrumentation
+
+
+def run_in(launch: Instrumentation, function: Callable, *args, **kwargs) -> Any:
+    """Calls function with launch as the current instrumentation of the calling thread, for work a launch hands to another thread"""
+    previous = getattr(_LOCAL, "instrumentation", None)
+    _LOCAL.instrumentation = launch
+    try:
+        return function(*args, **kwargs)
+    finally:
+        if previous is None:
+            del _LOCAL.instrumentation
+        else:
+            _LOCAL.instrumentation = previous
+
+
+def phase(name: str):
+    """Times the with block as phase name of the current launch"""
+    return current().phase(name)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Adds value to counter name of the current launch"""
+    current().count(name, value)
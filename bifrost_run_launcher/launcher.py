@@ -6,22 +6,30 @@ import argparse
 import os
 import sys
 import traceback
-from bifrost_run_launcher import pipeline
-from bifrostlib import datahandling
-from bifrostlib.datahandling import Component
-from bifrostlib.datahandling import ComponentReference
 import yaml
 import pprint
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+# pipeline and bifrostlib (pandas, pymongo) are imported on first use so --help doesn't pay for them
 
 
 global COMPONENT
 
 
-def initialize():
+def load_config() -> Dict:
     with open(os.path.join(os.path.dirname(__file__), 'config.yaml')) as fh:
-        config: Dict = yaml.load(fh, Loader=yaml.FullLoader)
+        config: Dict = yaml.load(fh, Loader=yaml.CSafeLoader if hasattr(yaml, "CSafeLoader") else yaml.SafeLoader)
+    return config
+
 
+def initialize():
+    from bifrost_run_launcher import database
+    from bifrostlib import datahandling
+    from bifrostlib.datahandling import Component
+    from bifrostlib.datahandling import ComponentReference
+    config: Dict = load_config()
+
+    if 'BIFROST_DB_KEY' in os.environ:
+        database.connect() # pooled client that bifrostlib then reuses
     if not(datahandling.has_a_database_connection()):
         raise ConnectionError("BIFROST_DB_KEY is not set or other connection error")
 
@@ -40,6 +48,13 @@ def initialize():
     return
 
 
+def initialize_offline():
+    """Component from config.yaml with a placeholder _id, for --plan which doesn't connect to the DB"""
+    global COMPONENT
+    COMPONENT = load_config()
+    COMPONENT["_id"] = {"$oid": "f" * 24}
+
+
 def install_component():
     COMPONENT['install']['path'] = os.path.os.getcwd()
     print(f"Installing with path:{COMPONENT['install']['path']}")
@@ -65,7 +80,8 @@ class types():
             raise argparse.ArgumentTypeError(f"{path} #Bad directory path")
 
 
-def parse_and_run(args: List[str]) -> None:
+def get_parsers() -> Tuple[argparse.ArgumentParser, argparse.ArgumentParser]:
+    """Parser for --reinstall/--info and parser for the pipeline options, defaults come from COMPONENT and the environment"""
     description: str = (
         f"-Description------------------------------------\n"
         f"{COMPONENT['details']['description']}"
@@ -89,6 +105,18 @@ def parse_and_run(args: List[str]) -> None:
         action='store_true',
         help='Provides basic information on COMPONENT'
     )
+    basic_parser.add_argument(
+        '--batch',
+        nargs='+',
+        default=None,
+        help='Run folders or glob patterns of run folders to launch, each run folder is the output directory with its run_metadata.tsv and reads. Other arguments apply to every run'
+    )
+    basic_parser.add_argument(
+        '--batch_workers',
+        type=int,
+        default=1,
+        help='Number of worker processes launching the runs of --batch, each with its own component and DB connection'
+    )
 
     #Second parser for the arguements related to the program, everything can be set to defaults (or has defaults)
     parser: argparse.ArgumentParser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -114,6 +142,12 @@ def parse_and_run(args: List[str]) -> None:
         default=os.path.join(os.environ.get('BIFROST_CONFIG_DIR', os.getcwd()), COMPONENT['options']['default_per']),
         type=types.file
     )
+    parser.add_argument(
+        '-per_asm', '--per_sample_asm_script',
+        help='Per sample script template run on each assembly (ASM) sample, defaults to the per sample script',
+        default=None if not os.path.isfile(os.path.join(os.environ.get('BIFROST_CONFIG_DIR', os.getcwd()), COMPONENT['options'].get('default_per_asm', ""))) else os.path.join(os.environ.get('BIFROST_CONFIG_DIR', os.getcwd()), COMPONENT['options']['default_per_asm']),
+        type=types.file
+    )
     parser.add_argument(
         '-post', '--post_script',
         help='Post script template run after sample script',
@@ -148,6 +182,22 @@ def parse_and_run(args: List[str]) -> None:
         default=None if not os.path.isfile(os.path.join(os.environ.get('BIFROST_CONFIG_DIR', os.getcwd()), COMPONENT['options']['default_colmap'])) else os.path.join(os.environ.get('BIFROST_CONFIG_DIR', os.getcwd()), COMPONENT['options']['default_colmap']),
         type=types.file
     )
+    parser.add_argument(
+        '--metadata_engine',
+        choices=['pandas', 'arrow'],
+        default='pandas',
+        help='Reader for tsv metadata, arrow uses pyarrow and reads sample_name/filenames/provided_species as text. Parquet and Feather metadata are always read with pyarrow'
+    )
+    parser.add_argument(
+        '--metadata_columns',
+        default=None,
+        help='Only read these metadata columns (after colmap) besides sample_name, filenames and provided_species. Use a comma for separation, None reads all columns'
+    )
+    parser.add_argument(
+        '--recursive_scan',
+        action='store_true',
+        help='Also look for the files named in the metadata in subfolders of the reads folder, file names must be unique across subfolders'
+    )
     parser.add_argument(
         '-id', '--run_id',
         default=None,
@@ -158,6 +208,11 @@ def parse_and_run(args: List[str]) -> None:
         action="store_true",
         help='For re-running a run'
     )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Relaunch an existing run, only samples that are new or changed in the metadata or reads folder are saved and put in the run script'
+    )
     parser.add_argument( # get a way to replace the info in per script in pipeline.py
        '-co', '--component_subset',
        default="bifrost_min_read_check_v2_2_8,bifrost_whats_my_species_v2_2_11__171019,bifrost_assemblatron_v2_2_16,bifrost_ssi_stamper_v2_2_11,bifrost_cge_mlst_v2_2_6__210314",
@@ -170,7 +225,102 @@ def parse_and_run(args: List[str]) -> None:
        default=None,
        help='Sample subset to process, None will run all samples. Use a comma for separation'
     )
+    parser.add_argument(
+        '--check_reads',
+        action='store_true',
+        help='Count reads of every read pair before registering samples, samples with broken, unequal or too few reads are left out of the run script'
+    )
+    parser.add_argument(
+        '--min_reads',
+        type=int,
+        default=0,
+        help='Minimum number of read pairs for a sample to pass --check_reads'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='Number of parallel processes, defaults to the number of CPUs'
+    )
+    parser.add_argument(
+        '--shard_size',
+        type=int,
+        default=0,
+        help='Write the run script as shards/shard_*.sh with this many samples each and a shards/manifest.tsv instead of one run_script.sh, 0 writes run_script.sh'
+    )
+    parser.add_argument(
+        '--execute',
+        action='store_true',
+        help='Run the shards after writing them with at most --jobs at a time, rerun with bifrost_run_launcher.executor to retry failed shards'
+    )
+    parser.add_argument(
+        '--scheduler',
+        choices=['slurm', 'sge', 'pbs'],
+        default=None,
+        help='Write array job scripts and shards/submit.sh for the scheduler, each task runs one shard (one sample unless --shard_size is set). Resources come from scheduler_resources in config.yaml'
+    )
+    parser.add_argument(
+        '--db_writers',
+        type=int,
+        default=0,
+        help='Number of sample bulk writes in flight while the next samples are built, 0 builds all samples before saving them'
+    )
+    parser.add_argument(
+        '--snapshot_compress',
+        action='store_true',
+        help='Write the run and samples snapshot gzipped as run.yaml.gz and samples.yaml.gz'
+    )
+    parser.add_argument(
+        '--from_snapshot',
+        action='store_true',
+        help='With --re_run or --incremental read the run and its samples from run.yaml and samples.yaml of the last launch in the output directory instead of the DB'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Run the launch under cProfile and write launch.prof to the output directory, phase timings are always written to launch_report.json'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Validate the metadata and reads folder and render the run script with placeholder ids without connecting to the DB. The scripts and plan.json with the issues and estimated DB operations are written to the plan folder of the output directory'
+    )
+    parser.add_argument(
+        '--no_cache', '--no-cache',
+        action='store_true',
+        help='Do not use or update the file cache (file_cache.sqlite in the output directory) of read counts and file dates'
+    )
+    return (basic_parser, parser)
+
+
+def parse_pipeline_options(args: List[str], parser: Optional[argparse.ArgumentParser] = None) -> argparse.Namespace:
+    """Pipeline options from launcher arguments, unknown arguments are ignored"""
+    if parser is None:
+        basic_parser, parser = get_parsers()
+    pipeline_options, junk = parser.parse_known_args(args)
+    if pipeline_options.scheduler is not None and pipeline_options.execute:
+        parser.error("--execute runs the shards here and --scheduler submits them, use one of them")
+    pipeline_options.component = COMPONENT # Want to access the component as well so forcing it as an option
+    if pipeline_options.run_name is None:
+        pipeline_options.run_name = os.path.abspath(pipeline_options.outdir).split("/")[-1]
+    return pipeline_options
+
 
+def run_folder_arguments(run_folder: str, metadata_name: str = "run_metadata.tsv") -> List[str]:
+    """Launcher arguments making run_folder the output directory and run name, with its metadata file and reads
+
+    Note:
+        The reads folder is the component's default_reads subfolder of run_folder when it exists, else run_folder.
+        Arguments given after these override them.
+    """
+    reads_folder = os.path.join(run_folder, COMPONENT['options']['default_reads'])
+    return ["--outdir", run_folder,
+            "--run_metadata", os.path.join(run_folder, metadata_name),
+            "--reads_folder", reads_folder if os.path.isdir(reads_folder) else run_folder]
+
+
+def parse_and_run(args: List[str]) -> None:
+    basic_parser, parser = get_parsers()
     try:
         basic_options, extras = basic_parser.parse_known_args(args)
         if basic_options.reinstall:
@@ -179,11 +329,13 @@ def parse_and_run(args: List[str]) -> None:
         elif basic_options.info:
             show_info()
             return None
+        elif basic_options.batch is not None:
+            from bifrost_run_launcher import batch
+            results = batch.run_batch(basic_options.batch, extras, basic_options.batch_workers)
+            if any(result["status"] != batch.DONE for result in results):
+                sys.exit(1)
         else:
-            pipeline_options, junk = parser.parse_known_args(extras)
-            pipeline_options.component = COMPONENT # Want to access the component as well so forcing it as an option
-            if pipeline_options.run_name is None:
-                pipeline_options.run_name = os.path.abspath(pipeline_options.outdir).split("/")[-1]
+            pipeline_options = parse_pipeline_options(extras, parser)
             if pipeline_options.debug is True:
                 print(pipeline_options)
             run_pipeline(pipeline_options)
@@ -192,17 +344,47 @@ def parse_and_run(args: List[str]) -> None:
 
 
 def show_info():
-    pprint.pprint(COMPONENT.json)
+    pprint.pprint(getattr(COMPONENT, "json", COMPONENT))
 
 def run_pipeline(args: object):
+    from bifrost_run_launcher import pipeline
     try:
-        pipeline.run_pipeline(args)
+        if getattr(args, "profile", False):
+            import cProfile
+            from bifrost_run_launcher.instrumentation import PROFILE_NAME
+            os.makedirs(args.outdir, exist_ok=True)
+            profile_path = os.path.join(os.path.abspath(args.outdir), PROFILE_NAME)
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(pipeline.run_pipeline, args)
+            finally:
+                profiler.dump_stats(profile_path)
+                print(f"Profile written to {profile_path}, view with python -m pstats {profile_path}")
+        else:
+            pipeline.run_pipeline(args)
     except:
         print(traceback.format_exc())
+        if getattr(args, "plan", False):
+            sys.exit(1) # so a sheet that fails to plan fails CI
+
+
+def is_help_request(args: List[str]) -> bool:
+    return any(arg in ("-h", "--help") for arg in args)
+
+
+def is_plan_request(args: List[str]) -> bool:
+    return "--plan" in args
 
 
 def main(args=sys.argv):
-    initialize()
+    if is_help_request(args):
+        # help only needs the descriptions and defaults, which come from config.yaml without a DB connection
+        global COMPONENT
+        COMPONENT = load_config()
+    elif is_plan_request(args):
+        initialize_offline()
+    else:
+        initialize()
     parse_and_run(args)
 
 
@@ -9,98 +9,284 @@ import traceback
 import pandas as pd
 import json
 import sys
+import functools
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from bifrostlib.datahandling import RunReference
 from bifrostlib.datahandling import Run
 from bifrostlib.datahandling import Sample
+from bifrostlib.datahandling import SampleReference
 from bifrostlib.datahandling import Category
 from bifrostlib.datahandling import Component
-import pprint
-import pymongo
-from typing import List, Set, Dict, TextIO, Pattern, Tuple,Optional
-from pymongo.errors import DuplicateKeyError
-from Bio import SeqIO
+from bifrostlib.datahandling import Metadata
+from bifrostlib import database_interface
+from bifrost_run_launcher import database
+from bifrost_run_launcher import executor
+from bifrost_run_launcher import instrumentation
+from bifrost_run_launcher import preflight
+from bifrost_run_launcher import scheduler
+from bifrost_run_launcher import snapshot
+from bifrost_run_launcher.file_cache import FileCache, DEFAULT_CACHE_NAME
+from typing import Any, Deque, Iterable, Iterator, List, NamedTuple, Set, Dict, TextIO, Pattern, Tuple, Optional, Union
+from pymongo.errors import BulkWriteError
+from pymongo import InsertOne, UpdateOne
+from bson import ObjectId
 from datetime import datetime
-import gzip
 
 os.umask(0o002)
 
+#define extensions for what is assumed to be unique to sequence reads and assemblies to differentiate in metadata
+SEQ_READS_EXT = {".fq", ".fastq", ".fq.gz", ".fastq.gz"}
+ASM_EXT = {".fa", ".fasta", ".fa.gz", ".fasta.gz", ".fas", ".fas.gz", ".fna", ".fna.gz"}
+
+
+def classify_file(file_name: str) -> Optional[str]:
+    """Classifies a file by extension as sequence reads (SEQ), an assembly (ASM) or neither (None)"""
+    base, ext = os.path.splitext(file_name)  # Extract first extension
+    if ext == ".gz":  # Handle double extensions like .fastq.gz
+        base, ext = os.path.splitext(base)  # Extract real file type before .gz
+    ext = ext.lower()  # Normalize to lowercase
+    if ext in SEQ_READS_EXT:
+        return "SEQ"
+    elif ext in ASM_EXT:
+        return "ASM"
+    return None
+
+
+class FileEntry(NamedTuple):
+    name: str # path relative to the scanned directory
+    path: str # absolute path
+    size: int
+    mtime_ns: int
+    ctime: float
+    inode: int
+    mode: Optional[str] # SEQ, ASM or None
+
+    @property
+    def signature(self) -> Tuple[int, int, int]:
+        return (self.size, self.mtime_ns, self.inode)
+
+
+class FileTable:
+    """Files of a reads folder, scanned once with os.scandir and stat'd once each
+
+    Note:
+        With recursive=True files in subfolders (e.g. one folder per sample) are included and can be
+        looked up by their file name as long as it is unique across the folders.
+    """
+    def __init__(self, directory: str, recursive: bool = False) -> None:
+        self.directory = os.path.abspath(directory)
+        self.recursive = recursive
+        self.entries: Dict[str, FileEntry] = {}
+        self.subdirectories: List[str] = []
+        self.stat_calls = 0
+        by_file_name: Dict[str, List[FileEntry]] = {}
+        folders = [(self.directory, "")]
+        while folders:
+            folder, prefix = folders.pop()
+            with os.scandir(folder) as scan:
+                for entry in scan:
+                    if entry.is_dir():
+                        if recursive:
+                            folders.append((entry.path, prefix + entry.name + "/"))
+                        elif prefix == "":
+                            self.subdirectories.append(entry.name)
+                        continue
+                    try:
+                        stat = entry.stat()
+                        self.stat_calls += 1
+                    except OSError: # e.g. broken symlinks
+                        continue
+                    file_entry = FileEntry(prefix + entry.name, os.path.join(self.directory, prefix + entry.name), stat.st_size, stat.st_mtime_ns, stat.st_ctime, stat.st_ino, classify_file(entry.name))
+                    self.entries[file_entry.name] = file_entry
+                    by_file_name.setdefault(entry.name, []).append(file_entry)
+        self._by_file_name = {file_name: entries[0] for file_name, entries in by_file_name.items() if len(entries) == 1}
+
+    def get(self, name: str) -> Optional[FileEntry]:
+        """Get a file by its path relative to the directory, or when scanned recursively by its unique file name"""
+        file_entry = self.entries.get(name, None)
+        if file_entry is None and self.recursive:
+            file_entry = self._by_file_name.get(name, None)
+        return file_entry
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def names(self) -> Set[str]:
+        """Names as listed by os.listdir for a flat scan, relative paths of all files for a recursive scan"""
+        return set(self.entries) | set(self.subdirectories)
+
+
 def parse_directory(directory: str, 
                     file_name_list: List[Tuple[str,str]], 
                     run_metadata: pd.DataFrame, 
-                    run_metadata_filename: str) -> Tuple[Dict, List[str], str]:
-    
-    all_files: Set[str] = set(os.listdir(directory))
-    unused_files: Set[str] = set(all_files)
+                    run_metadata_filename: str,
+                    file_table: Optional[FileTable] = None) -> Tuple[Dict, List[str], Dict[str, str]]:
+    """Matches the files named in the metadata with the folder
+
+    Returns:
+        Tuple[Dict, List[str], Dict[str, str]]: sample name to its files for samples with all files present, files in the
+            folder not named in the metadata and sample name to mode (SEQ or ASM) from the file extensions named in the metadata
+    """
+    if file_table is None:
+        file_table = FileTable(directory)
+    unused_files: Set[str] = file_table.names()
     sample_dict = {}
-        
-    bifrost_mode = None #Either SEQ or ASM
-    
-    #define extensions for what is assumed to be unique to sequence reads and assemblies to differentiate in metadata
-    seq_reads_ext = {".fq", ".fastq", ".fq.gz", ".fastq.gz"}
-    asm_ext = {".fa", ".fasta", ".fa.gz", ".fasta.gz", ".fas", ".fas.gz", ".fna", ".fna.gz"}
+    samples_by_files = index_metadata(run_metadata, "filenames")
+    sample_names = run_metadata["sample_name"].tolist()
+    sample_modes: Dict[str, str] = {} #Either SEQ or ASM, a run can mix both
 
     for sample_files in file_name_list:
         # Downstream it is assumed that there are exactly two sequence files, 
         # so we test and complain here if that is not the case.
-
-        file_extensions = set()
-        base, ext = os.path.splitext(sample_files[0])  # Extract first extension
-        
-        if ext == ".gz":  # Handle double extensions like .fastq.gz
-            base, ext = os.path.splitext(base)  # Extract real file type before .gz
-            file_extensions.add(ext.lower())  # Normalize to lowercase
-        else:
-            file_extensions.add(ext.lower())
+        file_mode = classify_file(sample_files[0])
 
         # checking if sequence reads
-        if file_extensions.issubset(seq_reads_ext):
+        if file_mode == "SEQ":
             # For paired-end sequence read files - ensure exactly two files exist
             if len(sample_files) != 2:
                 print("Sample files:\n"+"\n".join(sample_files),file=sys.stderr)
                 raise ValueError(f"Error: Sample {sample_files} has {len(sample_files)} sequence files, it must have exactly two read files")
-            bifrost_mode = "SEQ"
-        elif file_extensions.issubset(asm_ext):
+        elif file_mode == "ASM":
             if len(sample_files) != 1:
                 raise ValueError(f"Error: Sample {sample_files} has {len(sample_files)} assembly files, it must have exactly one assembly file.")
-            bifrost_mode = "ASM"
+        if file_mode is not None:
+            for position in samples_by_files.get(sample_files, []):
+                sample_modes[sample_names[position]] = file_mode
 
-        if all_files.issuperset(sample_files):
-            unused_files.difference_update(sample_files)
-            sample_name = run_metadata.loc[lambda df: df["filenames"] == sample_files, "sample_name"]
-            for n in sample_name:
-                sample_dict[n] = list(sample_files)
+        if all(sample_file in file_table for sample_file in sample_files):
+            unused_files.difference_update(file_table.get(sample_file).name for sample_file in sample_files)
+            for position in samples_by_files.get(sample_files, []):
+                sample_dict[sample_names[position]] = list(sample_files)
     
-    if bifrost_mode is None:
+    if len(sample_modes) == 0:
         raise ValueError("Unable to create run_script for pipeline initiation due to no valid sequencing or assembly files detected.")
 
     unused_files.discard(run_metadata_filename)
-    return (sample_dict, list(unused_files), bifrost_mode)
+    return (sample_dict, list(unused_files), sample_modes)
+
+
+def get_run_mode(sample_modes: Dict[str, str]) -> str:
+    """SEQ or ASM when all samples have the same mode, MIXED otherwise"""
+    modes = set(sample_modes.values())
+    if len(modes) == 1:
+        return modes.pop()
+    return "MIXED"
+
+
+def get_sample_mode(sample: Sample) -> Optional[str]:
+    """Mode of a sample from its categories, SEQ for paired_reads and ASM for events"""
+    categories = sample.json.get("categories", {})
+    if "paired_reads" in categories:
+        return "SEQ"
+    elif "events" in categories:
+        return "ASM"
+    return None
+
+
+METADATA_REQUIRED_COLUMNS = ["sample_name", "filenames", "provided_species"]
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+FEATHER_EXTENSIONS = (".feather", ".arrow")
+
+
+def _metadata_columns_available(run_metadata: str) -> List[str]:
+    if run_metadata.endswith(PARQUET_EXTENSIONS):
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(run_metadata).names
+    elif run_metadata.endswith(FEATHER_EXTENSIONS):
+        import pyarrow.ipc
+        with pyarrow.ipc.open_file(run_metadata) as reader:
+            return reader.schema.names
+    with open(run_metadata, "r") as fh:
+        return fh.readline().rstrip("\r\n").split("\t")
+
+
+def _read_table_arrow(run_metadata: str, columns: Optional[List[str]], string_columns: List[str]) -> pd.DataFrame:
+    import pyarrow
+    import pyarrow.compute
+    from pyarrow import csv
+    convert_options = csv.ConvertOptions(
+        include_columns=columns,
+        column_types={column: pyarrow.string() for column in string_columns},
+        strings_can_be_null=True,
+        timestamp_parsers=[]
+    )
+    table = csv.read_csv(run_metadata, parse_options=csv.ParseOptions(delimiter="\t"), convert_options=convert_options)
+    # pyarrow infers dates where read_table keeps the text, cast them back to (ISO formatted) strings
+    for i, field in enumerate(table.schema):
+        if pyarrow.types.is_temporal(field.type):
+            table = table.set_column(i, field.name, pyarrow.compute.cast(table.column(i), pyarrow.string()))
+    return table.to_pandas()
+
+
+def read_metadata_table(run_metadata: str,
+                        column_map: Optional[Dict[str, str]] = None,
+                        columns: Optional[List[str]] = None,
+                        engine: str = "pandas") -> pd.DataFrame:
+    """Reads the run metadata sheet with the colmap applied
+
+    Note:
+        Parquet (.parquet, .pq) and Feather (.feather, .arrow) sheets are read directly, other files as tsv.
+        The arrow engine uses the pyarrow csv reader with sample_name, filenames and provided_species read
+        as text.
+
+    Args:
+        run_metadata (str): path to the sheet
+        column_map (Dict[str, str], optional): sheet column name to bifrost column name. Defaults to None.
+        columns (List[str], optional): bifrost column names to keep besides the required ones, None keeps all columns. Defaults to None.
+        engine (str, optional): "pandas" or "arrow" for tsv sheets. Defaults to "pandas".
+
+    Returns:
+        pd.DataFrame: sheet with bifrost column names
+    """
+    column_map = column_map if column_map is not None else {}
+    sheet_names = {bifrost_name: sheet_name for sheet_name, bifrost_name in column_map.items()}
+    available = None
+    usecols = None
+    if columns is not None or engine == "arrow":
+        available = _metadata_columns_available(run_metadata)
+    if columns is not None:
+        wanted = [sheet_names.get(column, column) for column in dict.fromkeys(METADATA_REQUIRED_COLUMNS + list(columns))]
+        usecols = [column for column in available if column in wanted]
+
+    if run_metadata.endswith(PARQUET_EXTENSIONS):
+        df = pd.read_parquet(run_metadata, columns=usecols)
+    elif run_metadata.endswith(FEATHER_EXTENSIONS):
+        df = pd.read_feather(run_metadata, columns=usecols)
+    elif engine == "arrow":
+        string_columns = [sheet_names.get(column, column) for column in METADATA_REQUIRED_COLUMNS]
+        df = _read_table_arrow(run_metadata, usecols, [column for column in string_columns if column in available])
+    else:
+        df = pd.read_table(run_metadata, usecols=usecols)
+    return df.rename(columns=column_map)
 
 
 def format_metadata(run_metadata: TextIO, 
-                    rename_column_file: TextIO = None) -> pd.DataFrame:
+                    rename_column_file: TextIO = None,
+                    columns: Optional[List[str]] = None,
+                    engine: str = "pandas") -> pd.DataFrame:
     df = None
 
     try:
-        df = pd.read_table(run_metadata)
-
         # Rename columns if a colmap json mapping file is provided - consider removing this in a future iteration
+        column_map = None
         if rename_column_file is not None:
             with open(rename_column_file, "r") as rename_file:
-                df = df.rename(columns=json.load(rename_file))
+                column_map = json.load(rename_file)
+        df = read_metadata_table(run_metadata, column_map, columns, engine)
         
         # Drop unnamed columns (e.g., empty trailing columns from Excel)
         df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
         
         
-        samples_no_index = df[df["sample_name"].isna()].index # drop unnamed samples
-        samples_no_files_index = df[df["filenames"].isnull()].index # drop samples missing reads
-        idx_to_drop = samples_no_index.union(samples_no_files_index)
-        missing_files = ", ".join([df["sample_name"].iloc[i] for i in samples_no_files_index])
+        has_name = df["sample_name"].notna() # drop unnamed samples
+        has_files = df["filenames"].notna() # drop samples missing reads
+        missing_files = ", ".join(df.loc[has_name & ~has_files, "sample_name"].astype(str))
         
         if len(missing_files) > 0:
             print(f"samples {missing_files} missing files.")
-        df = df.drop(idx_to_drop)
+        df = df.loc[has_name & has_files].copy()
         
         # Save original `sample_name` before cleaning
         df["temp_sample_name"] = df["sample_name"]
@@ -112,15 +298,14 @@ def format_metadata(run_metadata: TextIO,
         df["changed_sample_names"] = df['sample_name'] != df['temp_sample_name']
         df["duplicated_sample_names"] = df.duplicated(subset="sample_name", keep="first")
 
-        # Convert filenames from a string to a tuple
-        df["filenames"] = df["filenames"].apply(lambda x: tuple(x.strip().split('/')))
+        # Convert filenames from a string to a tuple, in one pass over the column
+        df["filenames"] = pd.Series([tuple(filenames.strip().split('/')) for filenames in df["filenames"].tolist()], index=df.index, dtype=object)
 
         # Initialize tracking columns
         df["haveReads"] = False
         df["haveAsm"] = False
         df["haveMetaData"] = True
-        
-        df = df.map(lambda x: None if pd.isna(x) else x) #consider since i have removed lambda also change to df = df.where(pd.notna(df), None)  -> Detect existing (non-missing) values. -> Replace values where the condition is False.
+        # missing values are kept as NA here and only turned into None by metadata_to_records
         return df
     except Exception as e:
         with pd.option_context('display.max_rows', None, 'display.max_columns', None):
@@ -128,11 +313,280 @@ def format_metadata(run_metadata: TextIO,
             print(traceback.format_exc(), file=sys.stderr)
         raise ValueError(f"Bad metadata and/or rename column file: {e}") from e
 
+def metadata_to_records(metadata: pd.DataFrame) -> List[Dict]:
+    """Rows of the metadata as dicts with missing values as None, built column wise which is much faster than DataFrame.to_dict"""
+    columns = list(metadata.columns)
+    values = []
+    for column in columns:
+        series = metadata[column]
+        if series.hasnans:
+            series = series.astype(object).where(series.notna(), None)
+        values.append(series.tolist())
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+def index_metadata(metadata: pd.DataFrame, column: str) -> Dict[Any, List[int]]:
+    """Maps every value of a metadata column to the row positions holding it, built once so lookups don't scan the DataFrame"""
+    index: Dict[Any, List[int]] = {}
+    for position, value in enumerate(metadata[column].tolist()):
+        index.setdefault(value, []).append(position)
+    return index
+
+def get_sample_data(input_folder: str, sample_files: List[str], run_mode: str, file_table: Optional[FileTable] = None) -> Any:
+    """Absolute file paths as stored in the summary data of paired_reads (SEQ) or events (ASM)"""
+    if file_table is not None:
+        paths = [file_table.get(sample_file).path for sample_file in sample_files]
+    else:
+        paths = [os.path.abspath(os.path.join(input_folder, sample_file)) for sample_file in sample_files]
+    if run_mode == "SEQ":
+        return paths
+    return paths[0]
+
+def sample_is_unchanged(sample: Sample, sample_metadata: Dict, sample_data: Any, run_mode: str) -> bool:
+    """Checks if a stored sample has the same sample_info summary and files as the current metadata and folder"""
+    categories = sample.json.get("categories", {})
+    data_category = "paired_reads" if run_mode == "SEQ" else "events"
+    return categories.get("sample_info", {}).get("summary", None) == sample_metadata and \
+        categories.get(data_category, {}).get("summary", {}).get("data", None) == sample_data
+
+def index_samples_by_name(samples: List[Sample]) -> Dict[str, Sample]:
+    """Maps sample names (as made by Run.sample_name_generator) to the samples, if a name repeats the last sample wins"""
+    return {sample["name"]: sample for sample in samples}
+
 def get_sample_names(metadata: pd.DataFrame) -> List["str"]:
     return list(set(metadata["sample_name"].tolist()))
 
 def get_file_pairs(metadata: pd.DataFrame) -> List[Tuple[str,str]]:
-    return list(set(metadata["filenames"].tolist()))
+    return list(dict.fromkeys(metadata["filenames"].tolist()))
+
+SAMPLE_BATCH_SIZE = 1000
+PIPELINED_BATCH_SIZE = 100 # smaller batches so writes start while later samples are still being built
+PLAN_FOLDER = "plan"
+PLAN_NAME = "plan.json"
+PLACEHOLDER_OID = "ffffffff{:016x}"
+
+
+def placeholder_id(number: int) -> Dict:
+    """_id used by --plan in place of one from the DB, ffffffff followed by number in hex"""
+    return {"$oid": PLACEHOLDER_OID.format(number)}
+
+
+def _write_batch(collection: Any, operations: List) -> Dict[int, Dict]:
+    """Sends one unordered bulk_write, returns the write errors by operation index"""
+    try:
+        collection.bulk_write(operations, ordered=False) # not wrapped in with_retry as inserts aren't idempotent, the driver retries writes once
+    except BulkWriteError as error:
+        return {write_error["index"]: write_error for write_error in error.details.get("writeErrors", [])}
+    return {}
+
+
+def _prepare_batch(batch: List[Sample]) -> Tuple[List, List[Dict], List[bool]]:
+    operations = []
+    documents = []
+    inserted = []
+    for sample in batch:
+        metadata = Metadata(value=sample["metadata"])
+        metadata.updated_now()
+        sample["metadata"] = metadata.json
+        document = database_interface.json_to_bson(sample.json)
+        if "_id" in document:
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": document}, upsert=True))
+            inserted.append(False)
+        else:
+            document["_id"] = ObjectId()
+            operations.append(InsertOne(document))
+            inserted.append(True)
+        documents.append(document)
+    return operations, documents, inserted
+
+
+def _finish_batch(batch: List[Sample], documents: List[Dict], inserted: List[bool], failed: Dict[int, Dict]) -> None:
+    for index, sample in enumerate(batch):
+        document = documents[index]
+        sample_name = sample.json.get("display_name", sample["name"])
+        if index in failed:
+            if inserted[index]:
+                document.pop("_id")
+            if failed[index].get("code") == 11000:
+                print(f"Sample {sample_name} exists - reusing")
+            else:
+                print(f"Sample {sample_name} failed to save: {failed[index].get('errmsg')}", file=sys.stderr)
+        sample.json = database_interface.bson_to_json(document)
+
+
+def save_samples(samples: Iterable[Sample], batch_size: int = SAMPLE_BATCH_SIZE, writers: int = 0) -> List[Sample]:
+    """Saves samples to the DB with unordered bulk writes instead of one round-trip per sample
+
+    Note:
+        New samples are inserted and existing samples (with an _id) are upserted on _id, which
+        mirrors Sample.save(). A sample that collides with an existing name is reported and kept
+        without an _id, the same as catching DuplicateKeyError on Sample.save().
+        With writers > 0 up to that many batches are written on threads while the next samples are
+        taken from samples, so a generator building the samples overlaps with the DB writes. When
+        that many batches are in flight the oldest is waited for, results are reported in order.
+
+    Args:
+        samples (Iterable[Sample]): samples to persist, updated in place with their DB values
+        batch_size (int, optional): max number of operations sent per bulk_write. Defaults to SAMPLE_BATCH_SIZE.
+        writers (int, optional): max number of bulk writes in flight, 0 writes each batch before taking the next samples. Defaults to 0.
+
+    Returns:
+        List[Sample]: the samples
+    """
+    collection = database.get_collection("sample")
+    launch = instrumentation.current() # the writer threads count their DB round trips into this launch
+    saved: List[Sample] = []
+    in_flight: Deque = deque()
+    def finish_oldest() -> None:
+        batch, documents, inserted, future = in_flight.popleft()
+        _finish_batch(batch, documents, inserted, future.result())
+
+    with ThreadPoolExecutor(max_workers=max(writers, 1)) as pool:
+        batch: List[Sample] = []
+        for sample in itertools.chain(samples, [None]):
+            if sample is not None:
+                batch.append(sample)
+                saved.append(sample)
+                if len(batch) < batch_size:
+                    continue
+            if len(batch) == 0:
+                continue
+            operations, documents, inserted = _prepare_batch(batch)
+            if writers > 0:
+                if len(in_flight) == writers:
+                    finish_oldest()
+                in_flight.append((batch, documents, inserted, pool.submit(instrumentation.run_in, launch, _write_batch, collection, operations)))
+            else:
+                _finish_batch(batch, documents, inserted, _write_batch(collection, operations))
+            batch = []
+        while in_flight:
+            finish_oldest()
+    return saved
+
+
+def load_samples(sample_references: List[SampleReference],
+                 sample_subset: Optional[Set[str]] = None) -> List[Sample]:
+    """Loads all referenced samples with a single $in query instead of one Sample.load per reference
+
+    Note:
+        Whole documents are loaded, as the samples are saved back, written to the snapshot and their
+        fields can be used by any placeholder of the per sample scripts.
+
+    Args:
+        sample_references (List[SampleReference]): references as stored on run.samples
+        sample_subset (Set[str], optional): only return samples whose sample_info sample_name is in the subset. Defaults to None.
+
+    Returns:
+        List[Sample]: loaded samples in the order of sample_references, unknown references are skipped
+    """
+    if len(sample_references) == 0:
+        return []
+    ids = []
+    names = []
+    for sample_reference in sample_references:
+        bson_reference = database_interface.json_to_bson(sample_reference.json)
+        if bson_reference.get("_id", None) is not None:
+            ids.append(bson_reference["_id"])
+        elif bson_reference.get("name", None) is not None:
+            names.append(bson_reference["name"])
+    query: Dict = {"$or": [{"_id": {"$in": ids}}, {"name": {"$in": names}}]}
+    if sample_subset is not None:
+        query["categories.sample_info.summary.sample_name"] = {"$in": list(sample_subset)}
+
+    by_id = {}
+    by_name = {}
+    for document in database.with_retry(lambda: list(database.get_collection("sample").find(query))):
+        by_id[document["_id"]] = document
+        if "name" in document:
+            by_name[document["name"]] = document
+
+    samples = []
+    for sample_reference in sample_references:
+        bson_reference = database_interface.json_to_bson(sample_reference.json)
+        if bson_reference.get("_id", None) is not None:
+            document = by_id.get(bson_reference["_id"], None)
+        else:
+            document = by_name.get(bson_reference.get("name", None), None)
+        if document is not None:
+            samples.append(Sample(schema_version=sample_reference.schema_version, value=database_interface.bson_to_json(document)))
+    return samples
+
+
+def set_seq_categories(sample: Sample, sample_metadata: Dict, read_paths: List[str], component: Component, read_check: Optional[Dict] = None) -> None:
+    """Sets the paired_reads and sample_info categories of a sequence reads (SEQ) sample"""
+    #samples collection 
+    paired_reads = Category(value={
+        "name": "paired_reads",
+        "component": {"id": component["_id"], 
+                      "name": component["name"]}, # giving paired reads component id?
+        "summary": {
+                "data": [
+                    read_paths[0],
+                    read_paths[1]
+                ]
+        }
+    })
+    if read_check is not None:
+        read_check_summary = {"read_check": "passed" if read_check["passed"] else read_check["reason"]}
+        if None not in read_check["read_counts"]:
+            read_check_summary["read_counts"] = read_check["read_counts"]
+        paired_reads["summary"] = dict(paired_reads["summary"], **read_check_summary)
+    sample.set_category(paired_reads)
+
+    sample_info = Category(value={
+        "name": "sample_info",
+        "component": {"id": component["_id"], 
+                      "name": component["name"]},
+        "summary": sample_metadata
+    })
+    sample.set_category(sample_info)
+
+
+def set_asm_categories(sample: Sample, sample_metadata: Dict, fasta_file: FileEntry, component: Component) -> None:
+    """Sets the events, sample_info and species_detection categories of an assembly (ASM) sample"""
+    #equivalent to the collection called "paired_reads" under "samples" category
+    fasta_file_path = fasta_file.path
+
+    events = Category(value={
+        "name": "events",
+        "component": {"id": component["_id"], 
+                      "name": component["name"]},
+        "summary": {
+            "data":fasta_file_path
+        },
+    })
+    sample.set_category(events)
+
+    sample_info = Category(value={
+        "name": "sample_info",
+        "component": {"id": component["_id"], 
+                      "name": component["name"]},
+        "summary": sample_metadata
+    })
+    sample.set_category(sample_info)
+
+    # some of these info should perhaps be changed in the future to accomodate the information extracted for the sequencing reads
+    creation_date = datetime.fromtimestamp(fasta_file.ctime).strftime("%Y-%m-%d") # ctime comes from the scan of the reads folder
+    timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+    species = sample_metadata["provided_species"]
+
+    species_detection = Category(value={
+        "name": "species_detection",
+        "component": {"id": component["_id"], 
+                      "name": "provided_metadata_species"},
+        "summary": {
+            "species": species,
+        },
+        "metadata": {
+            "created_at": creation_date,
+            "updated_at": timestamp
+        },
+        "version": {
+            "schema": ["v0_0_0"]
+        }
+    })
+    sample.set_category(species_detection)
+
 
 def initialize_run(run: Run, 
                    samples: List[Sample], 
@@ -141,154 +595,183 @@ def initialize_run(run: Run,
                    run_metadata: str = "run_metadata.txt", 
                    run_type: str = None, 
                    rename_column_file: str = None,
-                   component_subset: str = "ccc,aaa,bbb"
+                   component_subset: str = "ccc,aaa,bbb",
+                   check_reads: bool = False,
+                   min_reads: int = 0,
+                   processes: int = None,
+                   file_cache: Optional[FileCache] = None,
+                   incremental: bool = False,
+                   metadata_columns: Optional[List[str]] = None,
+                   metadata_engine: str = "pandas",
+                   recursive_scan: bool = False,
+                   db_writers: int = 0,
+                   snapshot_compress: bool = False,
+                   outdir: str = ".",
+                   plan: bool = False,
+                   refresh_existing: bool = False
                    ) -> Tuple[Run, List[Sample], str]:
-    
-    metadata = format_metadata(run_metadata, rename_column_file)
+    """Builds the samples of the run from the metadata and reads folder, saves them and the run and writes the snapshot
+
+    Note:
+        With plan nothing is saved or written, the new samples and the run get placeholder _ids instead.
+        With refresh_existing the samples are only used to find the unchanged ones, the samples that are
+        rebuilt are read again from the DB first, as samples from a snapshot lack what other components
+        wrote since and saving them would remove that.
+    """
+
+    with instrumentation.phase("format_metadata"):
+        metadata = format_metadata(run_metadata, rename_column_file, metadata_columns, metadata_engine)
     file_names_in_metadata = get_file_pairs(metadata)
-    sample_dict, unused_files, run_mode = parse_directory(input_folder, file_names_in_metadata, metadata, run_metadata)
+    with instrumentation.phase("parse_directory"):
+        # the reads folder is listed and stat'd once, every later lookup of a file goes through the table
+        file_table = FileTable(input_folder, recursive=recursive_scan)
+        sample_dict, unused_files, sample_modes = parse_directory(input_folder, file_names_in_metadata, metadata, run_metadata, file_table)
+    run_mode = get_run_mode(sample_modes)
+    instrumentation.count("files_stat", file_table.stat_calls)
+    instrumentation.count("samples", len(sample_dict))
 
     run_reference = run.to_reference()
-    sample_list: List(Sample) = []
+    rows_by_sample_name = index_metadata(metadata, "sample_name")
+    metadata_records = metadata_to_records(metadata)
+    samples_with_reads: Set[str] = set()
+    samples_with_asm: Set[str] = set()
+    existing_samples = index_samples_by_name(samples)
 
+    sample_metadata_by_name: Dict[str, Dict] = {}
     for sample_name in sample_dict:
-        metadata.loc[metadata["sample_name"] == sample_name, "haveMetaData"] = True
+        sample_metadata = dict(metadata_records[rows_by_sample_name[sample_name][0]]) # first row for the sample, more stable to missing fields
+        sample_metadata['filenames'] = list(sample_metadata['filenames']) # changing from tuple to list to match original
+        if sample_modes.get(sample_name, None) == "SEQ":
+            samples_with_reads.add(sample_name)
+            sample_metadata['haveReads'] = True
+        elif sample_modes.get(sample_name, None) == "ASM":
+            samples_with_asm.add(sample_name)
+            sample_metadata['haveAsm'] = True
+        sample_metadata_by_name[sample_name] = sample_metadata
+
+    # files that are neither reads nor assemblies give a sample no mode, it is reported and left out of the run
+    samples_with_unknown_file_types = [sample_name for sample_name in sample_dict if sample_name not in samples_with_reads and sample_name not in samples_with_asm]
+    for sample_name in samples_with_unknown_file_types:
+        print(f"Sample {sample_name} has files that are neither reads nor assemblies: {', '.join(sample_dict[sample_name])}", file=sys.stderr)
+    run_sample_names = [sample_name for sample_name in sample_dict if sample_name in samples_with_reads or sample_name in samples_with_asm]
 
-        sample = Sample(name=run.sample_name_generator(sample_name))
-        sample["run"] = run_reference
-        sample["display_name"] = sample_name
-        sample_exists = False
+    # with incremental only samples that are new or whose sample_info or files differ from the DB are rebuilt, saved and scripted
+    unchanged_samples: Set[str] = set()
+    if incremental:
+        for sample_name in run_sample_names:
+            sample_mode = sample_modes.get(sample_name, None)
+            existing_sample = existing_samples.get(run.sample_name_generator(sample_name), None)
+            if existing_sample is not None and sample_is_unchanged(existing_sample, sample_metadata_by_name[sample_name], get_sample_data(input_folder, sample_dict[sample_name], sample_mode, file_table), sample_mode):
+                unchanged_samples.add(sample_name)
+        print(f"{len(unchanged_samples)} samples unchanged, {len(run_sample_names) - len(unchanged_samples)} samples added or changed")
 
-        for i in range(len(samples)):
-            if samples[i]["name"] == sample_name:
+    if refresh_existing:
+        rebuilt_samples = [existing_samples[run.sample_name_generator(sample_name)].to_reference() for sample_name in run_sample_names
+                           if sample_name not in unchanged_samples and run.sample_name_generator(sample_name) in existing_samples]
+        if len(rebuilt_samples) > 0:
+            with instrumentation.phase("load_samples"):
+                existing_samples.update(index_samples_by_name(load_samples(rebuilt_samples)))
+
+    #checks number of minimum reads and that read pairs are intact, samples failing are registered but left out of the run script
+    read_checks: Dict[str, Dict] = {}
+    if check_reads and len(samples_with_reads) > 0:
+        read_pairs = {sample_name: tuple(get_sample_data(input_folder, sample_dict[sample_name], "SEQ", file_table))
+                      for sample_name in sample_dict if sample_name in samples_with_reads and sample_name not in unchanged_samples}
+        signatures = {file_entry.path: file_entry.signature for file_entry in file_table.entries.values()}
+        with instrumentation.phase("check_reads"):
+            read_checks = preflight.check_read_pairs(read_pairs, min_reads=min_reads, processes=processes, cache=file_cache, signatures=signatures)
+        for sample_name, read_check in read_checks.items():
+            if not read_check["passed"]:
+                print(f"Sample {sample_name} failed read check: {read_check['reason']}", file=sys.stderr)
+
+    sample_by_name: Dict[str, Sample] = {}
+    with instrumentation.phase("build_samples"): # summed with building the categories below
+        for sample_name in run_sample_names:
+            if sample_name in unchanged_samples:
+                continue
+            generated_sample_name = run.sample_name_generator(sample_name)
+            if generated_sample_name in existing_samples:
                 print(f"Sample {sample_name} exists")
-                sample_exists = True
-                sample = samples[i]
-        
-        if run_mode == "SEQ":
-            metadata.loc[metadata["sample_name"] == sample_name, "haveReads"] = True
-            
-            #checks number of minimum reads
-            read1, read2 = sample_dict[sample_name][0], sample_dict[sample_name][1]
-            read1_path = os.path.abspath(os.path.join(input_folder, read1))
-            read2_path = os.path.abspath(os.path.join(input_folder, read2))
-            
-            #samples collection 
-            paired_reads = Category(value={
-                "name": "paired_reads",
-                "component": {"id": component["_id"], 
-                              "name": component["name"]}, # giving paired reads component id?
-                "summary": {
-                        "data": [
-                            os.path.abspath(read1_path),
-                            os.path.abspath(read2_path)
-                        ]
-                }
-            })
-            sample.set_category(paired_reads)
-
-            sample_metadata = metadata.loc[metadata['sample_name'] == sample_name].to_dict(orient = 'records')[0] # more stable to missing fields
-            sample_metadata['filenames'] = list(sample_metadata['filenames']) # changing from tuple to list to match original
-
-            sample_info = Category(value={
-                "name": "sample_info",
-                "component": {"id": component["_id"], 
-                              "name": component["name"]},
-                "summary": sample_metadata
-            })
-            sample.set_category(sample_info)
-            print(f"accurately set the categories for the sample {sample_name} with run mode {run_mode}")
-        elif run_mode == "ASM":
-            metadata.loc[metadata["sample_name"] == sample_name, "haveAsm"] = True
-
-            #equivalent to the collection called "paired_reads" under "samples" category
-            event_fasta = sample_dict[sample_name][0]
-            fasta_file_path = os.path.abspath(os.path.join(input_folder,event_fasta))
-
-            events = Category(value={
-                "name": "events",
-                "component": {"id": component["_id"], 
-                              "name": component["name"]},
-                "summary": {
-                    "data":os.path.abspath(fasta_file_path)
-                },
-            })
-            sample.set_category(events)
-
-            sample_metadata = metadata.loc[metadata['sample_name'] == sample_name].to_dict(orient = 'records')[0] # more stable to missing fields
-            sample_metadata['filenames'] = list(sample_metadata['filenames']) # changing from tuple to list to match original
-
-            sample_info = Category(value={
-                "name": "sample_info",
-                "component": {"id": component["_id"], 
-                              "name": component["name"]},
-                "summary": sample_metadata
-            })
-            sample.set_category(sample_info)
-
-            # some of these info should perhaps be changed in the future to accomodate the information extracted for the sequencing reads
-            creation_timestamp = os.path.getctime(fasta_file_path)
-            creation_date = datetime.fromtimestamp(creation_timestamp).strftime("%Y-%m-%d")
-            timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
-
-            row = metadata.loc[metadata["sample_name"] == sample_name].iloc[0]
-            species = row["provided_species"]
-
-            species_detection = Category(value={
-                "name": "species_detection",
-                "component": {"id": component["_id"], 
-                              "name": "provided_metadata_species"},
-                "summary": {
-                    "species": species,
-                },
-                "metadata": {
-                    "created_at": creation_date,
-                    "updated_at": timestamp
-                },
-                "version": {
-                    "schema": ["v0_0_0"]
-                }
-            })
-            sample.set_category(species_detection)
-        
-        try:
-            sample.save()
-        except DuplicateKeyError:
-            print(f"Sample {sample_name} exists - reusing")
-        sample_list.append(sample)
+                sample = existing_samples[generated_sample_name]
+            else:
+                sample = Sample(name=generated_sample_name)
+                sample["run"] = run_reference
+                sample["display_name"] = sample_name
+            sample_by_name[sample_name] = sample
+
+    # categories are built per mode over the samples partitioned by their files, each sample built is counted as saved
+    instrumentation.count("samples_saved", 0)
+    def build_samples() -> Iterator[Sample]:
+        for sample_name in sample_by_name:
+            if sample_name in samples_with_reads:
+                read_paths = get_sample_data(input_folder, sample_dict[sample_name], "SEQ", file_table)
+                set_seq_categories(sample_by_name[sample_name], sample_metadata_by_name[sample_name], read_paths, component, read_checks.get(sample_name, None))
+                print(f"accurately set the categories for the sample {sample_name} with run mode SEQ")
+                instrumentation.count("samples_saved")
+                yield sample_by_name[sample_name]
+        for sample_name in sample_by_name:
+            if sample_name in samples_with_asm:
+                fasta_file = file_table.get(sample_dict[sample_name][0])
+                set_asm_categories(sample_by_name[sample_name], sample_metadata_by_name[sample_name], fasta_file, component)
+                instrumentation.count("samples_saved")
+                yield sample_by_name[sample_name]
+
+    if plan:
+        with instrumentation.phase("build_samples"):
+            built_samples = list(build_samples())
+        for number, sample in enumerate(built_samples, 1):
+            if "_id" not in sample.json:
+                sample["_id"] = placeholder_id(number)
+    elif db_writers > 0: # samples are saved in batches while the following samples are built
+        with instrumentation.phase("build_and_save_samples"):
+            save_samples(build_samples(), batch_size=PIPELINED_BATCH_SIZE, writers=db_writers)
+    else:
+        with instrumentation.phase("build_samples"):
+            built_samples = list(build_samples())
+        with instrumentation.phase("save_samples"):
+            save_samples(built_samples)
+
+    sample_list: List[Sample] = list(sample_by_name.values())
+    run_sample_list: List[Sample] = [sample_by_name[sample_name] if sample_name in sample_by_name else existing_samples[run.sample_name_generator(sample_name)]
+                                     for sample_name in run_sample_names]
+
+    metadata["haveReads"] = metadata["sample_name"].isin(samples_with_reads)
+    metadata["haveAsm"] = metadata["sample_name"].isin(samples_with_asm)
+    asm_samples = {sample_name for sample_name, sample_mode in sample_modes.items() if sample_mode == "ASM"}
+    seq_samples = {sample_name for sample_name, sample_mode in sample_modes.items() if sample_mode == "SEQ"}
 
     run['component_subset'] = component_subset # this might just be for annotating in the db
     #run["type"] = run_type
-    run["path"] = os.getcwd()
+    run["path"] = os.path.abspath(outdir)
 
-    if run_mode == "SEQ":
-        run["type"] = run_type
-        run["issues"] = {
-            "duplicated_samples": list(metadata[metadata['duplicated_sample_names'] == True]['sample_name']),
-            "changed_sample_names": list(metadata[metadata['changed_sample_names'] == True]['sample_name']),
-            "unused_files": unused_files,
-            "samples_without_reads": list(metadata[metadata['haveReads'] == False]['sample_name']),
-            "samples_without_metadata": list(metadata[metadata['haveMetaData'] == False]['sample_name']),
-        }
-    elif run_mode == "ASM":
-        run["type"] = "events"
-        run["issues"] = {
-            "duplicated_samples": list(metadata[metadata['duplicated_sample_names'] == True]['sample_name']),
-            "changed_sample_names": list(metadata[metadata['changed_sample_names'] == True]['sample_name']),
-            "unused_files": unused_files,
-            "samples_without_contigs": list(metadata[metadata['haveAsm'] == False]['sample_name']),
-            "samples_without_metadata": list(metadata[metadata['haveMetaData'] == False]['sample_name']),
-        }
+    run["type"] = "events" if run_mode == "ASM" else run_type
+    run["issues"] = {
+        "duplicated_samples": list(metadata[metadata['duplicated_sample_names'] == True]['sample_name']),
+        "changed_sample_names": list(metadata[metadata['changed_sample_names'] == True]['sample_name']),
+        "unused_files": unused_files,
+        "samples_with_unknown_file_types": samples_with_unknown_file_types,
+    }
+    if run_mode in ("SEQ", "MIXED"):
+        run["issues"]["samples_without_reads"] = list(metadata[(metadata['haveReads'] == False) & ~metadata["sample_name"].isin(asm_samples)]['sample_name'])
+    if run_mode in ("ASM", "MIXED"):
+        run["issues"]["samples_without_contigs"] = list(metadata[(metadata['haveAsm'] == False) & ~metadata["sample_name"].isin(seq_samples)]['sample_name'])
+    run["issues"]["samples_without_metadata"] = list(metadata[metadata['haveMetaData'] == False]['sample_name'])
+    if check_reads and run_mode in ("SEQ", "MIXED"):
+        run["issues"]["samples_failing_read_check"] = {sample_name: read_check["reason"] for sample_name, read_check in read_checks.items() if not read_check["passed"]}
 
-    run.samples = [i.to_reference() for i in sample_list]
-    run.save()
+    run.samples = [i.to_reference() for i in run_sample_list]
+    if plan:
+        run["_id"] = placeholder_id(0)
+    else:
+        with instrumentation.phase("save_run"):
+            run.save()
 
-    with open("run.yaml", "w") as fh:
-        fh.write(pprint.pformat(run.json))
-    with open("samples.yaml", "w") as fh:
-        for sample in sample_list:
-            fh.write(pprint.pformat(sample.json))
+        # all samples of the run, so a relaunch with --from_snapshot can use it instead of loading them from the DB
+        with instrumentation.phase("write_snapshot"):
+            snapshot.write_snapshot(run.json, (sample.json for sample in run_sample_list), outdir=outdir, compress=snapshot_compress)
 
+    failed_read_check = {run.sample_name_generator(sample_name) for sample_name, read_check in read_checks.items() if not read_check["passed"]}
+    sample_list = [sample for sample in sample_list if sample["name"] not in failed_read_check]
     return (run, sample_list, run_mode)
 
 def replace_run_info_in_script(script: str, run: object) -> str:
@@ -299,20 +782,93 @@ def replace_run_info_in_script(script: str, run: object) -> str:
     return script
 
 
-def replace_sample_info_in_script(script: str, sample: object) -> str:
-    positions_to_replace = re.findall(re.compile(r"\$sample\.[\.\[\]_a-zA-Z0-9]+"), script)
-    for item in positions_to_replace:
-        (item.split(".")[1:])
-        level = sample.json
+SAMPLE_PLACEHOLDER: Pattern = re.compile(r"\$sample\.[\.\[\]_a-zA-Z0-9]+")
+
+
+SAMPLE_PLACEHOLDER_KEY: Pattern = re.compile(r"([^\[\]]*)((?:\[[0-9]+\])*)")
+
+
+class PlaceholderError(KeyError):
+    """A $sample placeholder that can't be resolved in a sample"""
+    def __str__(self) -> str:
+        return self.args[0] # KeyError would quote the message
+
+
+class SamplePlaceholder:
+    """Accessor of one $sample placeholder, its path is parsed once into the keys and indices to look up
+
+    Note:
+        A key ending in id is an ObjectId and resolves to its $oid ({oid: <mongodb_id>}), indices are
+        written as key[0] and can be chained as key[0][1].
+    """
+    def __init__(self, item: str) -> None:
+        self.item = item
+        self.steps: List[Union[str, int]] = []
+        self.paths: List[str] = [] # placeholder up to and including each step, for errors
+        path = "$sample"
         for value in item.split(".")[1:]:
-            if value.endswith("]"):
-                (array_item, index) = value.split("[")
-                index = int(index[:-1])
-                level = level[array_item][index]
-            elif value.endswith("id"):
-                level = level[value]['$oid'] # {oid: <mongodb_id>}
+            match = SAMPLE_PLACEHOLDER_KEY.fullmatch(value)
+            if match is None:
+                raise PlaceholderError(f"{item}: can't parse {value}")
+            key, indices = match.groups()
+            path = f"{path}.{key}"
+            self.steps.append(key)
+            self.paths.append(path)
+            if indices:
+                for index in indices[1:-1].split("]["):
+                    path = f"{path}[{index}]"
+                    self.steps.append(int(index))
+                    self.paths.append(path)
+            elif key.endswith("id"):
+                self.steps.append("$oid")
+                self.paths.append(path)
+
+    def resolve(self, sample_json: Dict) -> Any:
+        """Value of the placeholder in sample_json
+
+        Raises:
+            PlaceholderError: If a key or index of the path is not in the sample
+        """
+        level = sample_json
+        for step in self.steps:
+            try:
+                level = level[step]
+            except (KeyError, IndexError, TypeError):
+                raise PlaceholderError(self._describe_missing(sample_json)) from None
+        return level
+
+    def _describe_missing(self, sample_json: Dict) -> str:
+        level = sample_json
+        parent = "$sample"
+        for step, path in zip(self.steps, self.paths):
+            if isinstance(step, int) and isinstance(level, list):
+                problem = f"index {step} out of range, {parent} has {len(level)} items"
+            elif isinstance(step, str) and isinstance(level, dict):
+                problem = f"no key {step!r} in {parent}"
             else:
-                level = level[value]
+                problem = f"{parent} is {type(level).__name__}, not {'a list' if isinstance(step, int) else 'an object'}"
+            try:
+                level = level[step]
+            except (KeyError, IndexError, TypeError):
+                return f"{self.item} not found in sample {sample_json.get('name', '')}: {problem}"
+            parent = path
+        return f"{self.item} not found in sample {sample_json.get('name', '')}"
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_sample_placeholder(item: str) -> SamplePlaceholder:
+    """Accessor of a $sample placeholder, parsed once per unique placeholder"""
+    return SamplePlaceholder(item)
+
+
+def resolve_sample_placeholder(item: str, sample_json: Dict) -> Any:
+    return compile_sample_placeholder(item).resolve(sample_json)
+
+
+def replace_sample_info_in_script(script: str, sample: object) -> str:
+    positions_to_replace = re.findall(SAMPLE_PLACEHOLDER, script)
+    for item in positions_to_replace:
+        level = resolve_sample_placeholder(item, sample.json)
         if(level is not None):
             if not isinstance(level, str):
                 level = str(level)
@@ -320,82 +876,316 @@ def replace_sample_info_in_script(script: str, sample: object) -> str:
     return script
 
 
-def generate_run_script(run: Run, samples: Sample, pre_script_location: str, per_sample_script_location: str, post_script_location: str) -> str:
-    script = ""
+class ScriptTemplate:
+    """Per sample script template parsed once into literal and $sample placeholder segments
+
+    Note:
+        Rendering gives the same text as replace_sample_info_in_script. When a template can't be
+        rendered segment by segment with that guarantee (a placeholder that is also a prefix of a
+        longer one, or a value containing $ that could form a new placeholder) the sample falls back to it.
+    """
+    def __init__(self, script: str) -> None:
+        """Initialization
+
+        Args:
+            script (str): template text with $run placeholders already replaced
+        """
+        self.script = script
+        self.segments: List[str] = [] # literals on even positions, placeholders on odd positions
+        position = 0
+        for match in SAMPLE_PLACEHOLDER.finditer(script):
+            self.segments.append(script[position:match.start()])
+            self.segments.append(match.group())
+            position = match.end()
+        self.segments.append(script[position:])
+        self.placeholders: List[str] = list(dict.fromkeys(self.segments[1::2]))
+        self.accessors: List[SamplePlaceholder] = [compile_sample_placeholder(item) for item in self.placeholders]
+        self.segmentable: bool = all(self._occurs_only_as_placeholder(item) for item in self.placeholders) and \
+            not any(self._ends_with_partial_placeholder(literal) for literal in self.segments[0:-1:2])
+
+    @staticmethod
+    def _ends_with_partial_placeholder(literal: str) -> bool:
+        return any(literal.endswith("$sample."[:i]) for i in range(1, len("$sample.")))
+
+    def _occurs_only_as_placeholder(self, item: str) -> bool:
+        placeholder_starts = [match.start() for match in SAMPLE_PLACEHOLDER.finditer(self.script) if match.group() == item]
+        occurrences = []
+        position = self.script.find(item)
+        while position != -1:
+            occurrences.append(position)
+            position = self.script.find(item, position + 1)
+        return occurrences == placeholder_starts
+
+    def render(self, sample: Sample) -> str:
+        if not self.segmentable:
+            return replace_sample_info_in_script(self.script, sample)
+        sample_json = sample.json
+        values: Dict[str, str] = {}
+        for item, accessor in zip(self.placeholders, self.accessors):
+            level = accessor.resolve(sample_json)
+            if level is None:
+                values[item] = item
+            else:
+                values[item] = level if isinstance(level, str) else str(level)
+                if "$" in values[item]:
+                    return replace_sample_info_in_script(self.script, sample)
+        segments = list(self.segments)
+        for i in range(1, len(segments), 2):
+            segments[i] = values[segments[i]]
+        return "".join(segments)
+
+
+def read_script_template(script_location: str, run: Run) -> str:
+    with open(script_location, "r") as script_file:
+        return replace_run_info_in_script(script_file.read(), run)
+
+
+def iter_run_script(run: Run, samples: List[Sample], pre_script_location: str, per_sample_script_location: str, post_script_location: str, per_sample_asm_script_location: Optional[str] = None) -> Iterator[str]:
+    """Yields the run script in pieces: the pre script, one block per sample and the post script
+
+    Note:
+        Assembly (ASM) samples use per_sample_asm_script_location when given, all other samples per_sample_script_location.
+    """
     if pre_script_location != None:
-        with open(pre_script_location, "r") as pre_script_file:
-            pre_script = pre_script_file.read()
-            script = script + replace_run_info_in_script(pre_script, run)
+        yield _counted(read_script_template(pre_script_location, run))
 
-    if per_sample_script_location != None:
-        with open(per_sample_script_location, "r") as per_sample_script_file:
-            per_sample_script = per_sample_script_file.read()
-        per_sample_script = replace_run_info_in_script(per_sample_script, run)
-        for sample in samples:
-            script = script + replace_sample_info_in_script(per_sample_script, sample)
+    for sample_name, block in iter_sample_scripts(run, samples, per_sample_script_location, per_sample_asm_script_location):
+        yield block
 
     if post_script_location != None:
-        with open(post_script_location, "r") as post_script_file:
-            post_script = post_script_file.read()
-        script = script + replace_run_info_in_script(post_script, run)
+        yield _counted(read_script_template(post_script_location, run))
 
+
+def _counted(script: str) -> str:
+    instrumentation.count("bytes_rendered", len(script.encode()))
     return script
 
 
-def run_pipeline(args: object) -> None:
-    if not os.path.isdir(args.outdir):
-        os.makedirs(args.outdir)
-    os.chdir(args.outdir)
+def iter_sample_scripts(run: Run, samples: List[Sample], per_sample_script_location: str, per_sample_asm_script_location: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Yields the sample name and rendered per sample script of each sample in run order"""
+    if per_sample_script_location != None:
+        per_sample_template = ScriptTemplate(read_script_template(per_sample_script_location, run))
+        templates = {"ASM": ScriptTemplate(read_script_template(per_sample_asm_script_location, run))} if per_sample_asm_script_location != None else {}
+        for sample in samples:
+            yield sample['categories']['sample_info']['summary']['sample_name'], _counted(templates.get(get_sample_mode(sample), per_sample_template).render(sample))
+
+
+def generate_run_script(run: Run, samples: Sample, pre_script_location: str, per_sample_script_location: str, post_script_location: str, per_sample_asm_script_location: Optional[str] = None) -> str:
+    return "".join(iter_run_script(run, samples, pre_script_location, per_sample_script_location, post_script_location, per_sample_asm_script_location))
+
+
+def write_run_script(run: Run, samples: List[Sample], pre_script_location: str, per_sample_script_location: str, post_script_location: str, script_location: str = "run_script.sh", per_sample_asm_script_location: Optional[str] = None) -> int:
+    """Streams the rendered run script to script_location instead of building it in memory
+
+    Note:
+        The script is written to a temp file that replaces script_location once it is complete, so a sample
+        that fails to render leaves the previous script in place instead of a truncated one.
+
+    Returns:
+        int: number of characters written
+    """
+    written = 0
+    with executor.open_atomic(script_location, buffering=1024 * 1024) as fh:
+        for piece in iter_run_script(run, samples, pre_script_location, per_sample_script_location, post_script_location, per_sample_asm_script_location):
+            written += fh.write(piece)
+    return written
+
+
+def write_sharded_run_script(run: Run, samples: List[Sample], pre_script_location: str, per_sample_script_location: str, post_script_location: str, outdir: str = ".", samples_per_shard: int = 1, per_sample_asm_script_location: Optional[str] = None) -> str:
+    """Writes the run script as shards of samples_per_shard samples with a manifest, see executor.write_shards
+
+    Returns:
+        str: path of the manifest
+    """
+    return executor.write_shards(
+        outdir,
+        iter_sample_scripts(run, samples, per_sample_script_location, per_sample_asm_script_location),
+        pre_script=_counted(read_script_template(pre_script_location, run)) if pre_script_location != None else None,
+        post_script=_counted(read_script_template(post_script_location, run)) if post_script_location != None else None,
+        samples_per_shard=samples_per_shard)
+
+
+def load_snapshot(run_reference: RunReference, outdir: str = ".") -> Tuple[Optional[Run], Optional[List[Sample]]]:
+    """Loads the run and its samples from the snapshot of the last launch in outdir
+
+    Note:
+        The snapshot is only used when it is of the referenced run, otherwise the run is loaded from the DB
+        and the samples are None so they are loaded from the DB too. Snapshot samples can be older than the
+        DB, initialize_run reads the ones it rebuilds again before saving them.
+
+    Returns:
+        Tuple[Optional[Run], Optional[List[Sample]]]: the run or None if it isn't in the DB, the samples or None
+    """
+    try:
+        snapshot_json = snapshot.read_snapshot(outdir)
+    except Exception as error: # e.g. a pprint dump from an older version
+        print(f"Unable to read snapshot, loading from DB: {error}", file=sys.stderr)
+        snapshot_json = None
+    if snapshot_json is not None:
+        run_json, samples_json = snapshot_json
+        reference = database_interface.json_to_bson(run_reference.json)
+        snapshot_id = database_interface.json_to_bson(run_json).get("_id", None)
+        if snapshot_id is not None and (str(reference.get("_id", None)) == str(snapshot_id) or (reference.get("_id", None) is None and reference.get("name", None) == run_json.get("name", None))):
+            print(f"Loaded run {run_json['name']} and {len(samples_json)} samples from snapshot")
+            return (Run(schema_version=run_reference.schema_version, value=run_json),
+                    [Sample(value=sample_json) for sample_json in samples_json])
+    print("No snapshot of the run, loading from DB")
+    return (Run.load(run_reference), None)
+
+
+def save_launch_report(run: Run, path: str = instrumentation.REPORT_NAME) -> Dict:
+    """Writes the instrumentation of the launch next to run.yaml and sets it as launch_report on the run in the DB"""
+    report = instrumentation.current().write(path)
+    run["launch_report"] = report
+    if "_id" in run.json:
+        database.with_retry(database.get_collection("run").update_one, {"_id": database_interface.json_to_bson(run.json)["_id"]}, {"$set": {"launch_report": report}})
+    return report
+
+
+def estimate_db_operations(samples_saved: int, db_writers: int = 0) -> Dict[str, int]:
+    """DB operations of launching a new run with samples_saved samples
+
+    Note:
+        round_trips is the db_round_trips counter of the launch report plus the update storing the report on the run.
+        Run.save sends a list_collection_names before its write, so the run save takes two round trips.
+    """
+    operations = {
+        "run_name_checks": 1,
+        "sample_inserts": samples_saved,
+        "sample_bulk_writes": -(-samples_saved // (PIPELINED_BATCH_SIZE if db_writers > 0 else SAMPLE_BATCH_SIZE)),
+        "run_saves": 1,
+        "launch_report_updates": 1,
+    }
+    operations["round_trips"] = (operations["run_name_checks"] + operations["sample_bulk_writes"]
+                                 + 2 * operations["run_saves"] + operations["launch_report_updates"])
+    return operations
+
+
+def write_plan(run: Run, path: str = PLAN_NAME, db_writers: int = 0) -> Dict:
+    """Writes and prints what a launch of the planned run would do: its samples, issues and estimated DB operations"""
+    plan = {
+        "run": run["name"],
+        "run_type": run.json.get("type", None),
+        "samples": len(run.samples),
+        "issues": run.json.get("issues", {}),
+        "estimated_db_operations": estimate_db_operations(instrumentation.current().counters.get("samples_saved", 0), db_writers),
+        **instrumentation.current().report(),
+    }
+    with open(path, "w") as fh:
+        json.dump(plan, fh, indent=2)
+    print(f"Plan of run {plan['run']} with {plan['samples']} samples written to {path}")
+    for issue, values in plan["issues"].items():
+        if len(values) > 0:
+            print(f"  {issue}: {len(values)} ({', '.join(str(value) for value in list(values)[:5])}{', ...' if len(values) > 5 else ''})")
+    print(f"  estimated DB operations: {plan['estimated_db_operations']}")
+    return plan
+
+
+def scheduler_resource_hints(component: Component) -> Dict[str, Dict]:
+    """scheduler_resources of the component, from the installed config.yaml when the component in the DB predates the option"""
+    resource_hints = component['options'].get('scheduler_resources', None)
+    if resource_hints is None:
+        from bifrost_run_launcher import launcher
+        resource_hints = launcher.load_config()['options'].get('scheduler_resources', {})
+        print("The component in the DB has no scheduler_resources, using those of config.yaml, run --reinstall to store them", file=sys.stderr)
+    return resource_hints
+
+
+def run_pipeline(args: object) -> Run:
+    """Launches the run described by args into args.outdir
+
+    Note:
+        The working directory is left unchanged, every output path is made from args.outdir, so
+        several runs can be launched from the threads of one process. With args.plan nothing is read
+        from or written to the DB and the file cache isn't used, the scripts are rendered with placeholder
+        _ids into the plan folder of args.outdir with plan.json, leaving the scripts of a launch as they are.
+    """
+    args.outdir = os.path.abspath(args.outdir)
+    instrumentation.reset()
+    with instrumentation.phase("launch"):
+        run = _run_pipeline(args)
+    if args.plan:
+        write_plan(run, os.path.join(args.outdir, PLAN_FOLDER, PLAN_NAME), args.db_writers)
+    else:
+        save_launch_report(run, os.path.join(args.outdir, instrumentation.REPORT_NAME))
+    return run
+
+
+def _run_pipeline(args: object) -> Run:
+    os.makedirs(args.outdir, exist_ok=True)
+    script_folder = os.path.join(args.outdir, PLAN_FOLDER) if args.plan else args.outdir
+    os.makedirs(script_folder, exist_ok=True)
 
     run_reference = RunReference(_id = args.run_id, name = args.run_name)
     print(f"{run_reference.json = }")
-    if args.re_run:
-        run: Run = Run.load(run_reference)
-        if run is None and args.run_id is not None: # mistyped id
-            raise ValueError(f"_id={args.run_id} not in db.")
-        elif run is None:
-            run: Run = Run(name=args.run_name)
+    snapshot_samples: Optional[List[Sample]] = None
+    if args.plan:
+        if args.re_run or args.incremental:
+            print("The DB isn't read with --plan, the run is planned as a new run", file=sys.stderr)
+        run: Run = Run(name=args.run_name)
+    elif (args.re_run or args.incremental) and args.from_snapshot:
+        with instrumentation.phase("load_run"):
+            run, snapshot_samples = load_snapshot(run_reference, args.outdir)
+    elif args.re_run or args.incremental:
+        with instrumentation.phase("load_run"):
+            run: Run = Run.load(run_reference)
     else:
         run: Run = Run(name=args.run_name)
-    samples: List[Sample] = []
-    # Add existing samples from run.samples if they exist
-    for sample_reference in run.samples:
-        sample = Sample.load(sample_reference)
-        if sample is not None:
-            samples.append(sample)
-    # check if the run has an id and whether it exists in the db
-    client = pymongo.MongoClient(os.environ['BIFROST_DB_KEY'])
-    db = client.get_database()
-    runs = db.runs
-    run_name_matches = [str(i["_id"]) for i in runs.find({"name":run['name']})]
+    if run is None and args.run_id is not None: # mistyped id
+        raise ValueError(f"_id={args.run_id} not in db.")
+    elif run is None:
+        run: Run = Run(name=args.run_name)
+    # Add existing samples from run.samples if they exist, when reprocessing a subset only those are fetched
+    sample_subset: Optional[Set[str]] = None
+    if "_id" in run.json and args.sample_subset is not None:
+        sample_subset = set(args.sample_subset.split(","))
+    with instrumentation.phase("load_samples"):
+        if snapshot_samples is not None:
+            samples: List[Sample] = [sample for sample in snapshot_samples if sample_subset is None or sample['categories']['sample_info']['summary']['sample_name'] in sample_subset]
+        else:
+            samples: List[Sample] = load_samples(run.samples, sample_subset)
+    # check if a new run collides with the name of a run already in the db
+    if not args.plan and "_id" not in run.json and database.name_exists("run", run['name']):
+        print(f"Run {run['name']} already exists in the DB, use --re_run to relaunch it", file=sys.stderr)
     if "_id" not in run.json or args.sample_subset is None:
         if args.debug:
             print(f"{run = }\n{samples = }")
 
-        run, samples, run_mode = initialize_run(run=run,
-                                                samples=samples,
-                                                component=args.component,
-                                                input_folder=args.reads_folder,
-                                                run_metadata=args.run_metadata,
-                                                run_type=args.run_type,
-                                                rename_column_file=args.run_metadata_column_remap,
-                                                component_subset=args.component_subset)
-        
-        print(f"Run {run['name']} and samples added to DB")
+        file_cache = None if args.no_cache or args.plan else FileCache(os.path.join(args.outdir, DEFAULT_CACHE_NAME))
+        try:
+            with instrumentation.phase("initialize_run"):
+                run, samples, run_mode = initialize_run(run=run,
+                                                        samples=samples,
+                                                        component=args.component,
+                                                        input_folder=args.reads_folder,
+                                                        run_metadata=args.run_metadata,
+                                                        run_type=args.run_type,
+                                                        rename_column_file=args.run_metadata_column_remap,
+                                                        component_subset=args.component_subset,
+                                                        check_reads=args.check_reads,
+                                                        min_reads=args.min_reads,
+                                                        processes=args.jobs,
+                                                        file_cache=file_cache,
+                                                        incremental=args.incremental,
+                                                        metadata_columns=args.metadata_columns.split(",") if args.metadata_columns is not None else None,
+                                                        metadata_engine=args.metadata_engine,
+                                                        recursive_scan=args.recursive_scan,
+                                                        db_writers=args.db_writers,
+                                                        snapshot_compress=args.snapshot_compress,
+                                                        outdir=args.outdir,
+                                                        plan=args.plan,
+                                                        refresh_existing=snapshot_samples is not None)
+        finally:
+            if file_cache is not None:
+                file_cache.close()
+
+        print(f"Run {run['name']} and samples planned, nothing saved to DB" if args.plan else f"Run {run['name']} and samples added to DB")
     else:
         print(f"Reprocessing samples from run {run['name']}") # we only want to subset samples from a pre-existing run
-        if args.sample_subset != None:
-            sample_subset = set(args.sample_subset.split(","))
-            sample_inds_to_keep = []
-            if len(samples) >= 1:
-                sample_names_orig = set([i['categories']['sample_info']['summary']['sample_name'] for i in samples])
-                missentered_subset_samples = ",".join([str(i) for i in (sample_subset - sample_names_orig)])
-                if len(missentered_subset_samples) > 0:
-                    print(f"{missentered_subset_samples} not present in run.")
-                for i,sample in enumerate(samples):
-                    if sample['categories']['sample_info']['summary']['sample_name'] in sample_subset:
-                        sample_inds_to_keep.append(i)
-            samples = [samples[i] for i in sample_inds_to_keep]
+        sample_names_orig = set([i['categories']['sample_info']['summary']['sample_name'] for i in samples])
+        missentered_subset_samples = ",".join([str(i) for i in (sample_subset - sample_names_orig)])
+        if len(missentered_subset_samples) > 0:
+            print(f"{missentered_subset_samples} not present in run.")
 
     if args.debug:
         print("run")
@@ -403,28 +1193,47 @@ def run_pipeline(args: object) -> None:
         print("samples")
         print(samples)
 
-    if run_mode == "SEQ":
-        script = generate_run_script(
-            run,
-            samples,
-            args.pre_script,
-            args.per_sample_script,
-            args.post_script)
-
-    # for now try with the same scripts, but make placeholder for additional pre,per and post
-    if run_mode == "ASM":
-        script = generate_run_script(
-            run,
-            samples,
-            args.pre_script,
-            args.per_sample_script,
-            args.post_script)
-        
-    with open("run_script.sh", "w") as fh:
-        fh.write(script)
+    # SEQ and ASM samples share the pre and post scripts, ASM samples can have their own per sample script
+    with instrumentation.phase("render_scripts"):
+        if args.scheduler is not None and args.shard_size == 0:
+            args.shard_size = 1 # one array task per sample
+        if args.shard_size > 0:
+            manifest_path = write_sharded_run_script(
+                run,
+                samples,
+                args.pre_script,
+                args.per_sample_script,
+                args.post_script,
+                outdir=script_folder,
+                samples_per_shard=args.shard_size,
+                per_sample_asm_script_location=args.per_sample_asm_script)
+        else:
+            write_run_script(
+                run,
+                samples,
+                args.pre_script,
+                args.per_sample_script,
+                args.post_script,
+                script_location=os.path.join(script_folder, "run_script.sh"),
+                per_sample_asm_script_location=args.per_sample_asm_script)
 
-    print(f"Done with output directory: {args.outdir}")
-    print("Done, to run execute bash run_script.sh")
+    print(f"Done with output directory: {script_folder}")
+    if args.scheduler is not None:
+        submit_path = scheduler.write_submission(
+            script_folder,
+            args.scheduler,
+            run['name'],
+            resource_hints=scheduler_resource_hints(args.component),
+            components=args.component_subset.split(",") if args.component_subset else None)
+        print(f"Done, to submit to {args.scheduler} execute bash {submit_path}")
+    elif args.shard_size > 0 and args.execute and not args.plan:
+        with instrumentation.phase("execute"):
+            executor.execute_manifest(args.outdir, args.jobs)
+    elif args.shard_size > 0:
+        print(f"Done, to run execute python -m bifrost_run_launcher.executor --jobs N or cut -f1 {manifest_path} | xargs -P N -n 1 bash (after the pre script)")
+    else:
+        print(f"Done, to run execute bash {os.path.join(script_folder, 'run_script.sh')}")
+    return run
 
 # if __name__ == "__main__":
 #     parse_args(sys.argv[1:])
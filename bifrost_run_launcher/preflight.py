@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Pre-flight checks of read files, run before samples are registered so truncated or empty read pairs are caught at launch
+"""
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from bifrost_run_launcher.file_cache import FileCache
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def count_lines(path: str) -> int:
+    """Counts lines of a plain or gzipped file by streaming it in chunks
+
+    Note:
+        Gzip files are decompressed chunk by chunk with zlib (multi member files such as bgzip are supported)
+        and newlines are counted with bytes.count, no records are parsed.
+
+    Args:
+        path (str): path to the file
+
+    Returns:
+        int: number of lines, a last line without a trailing newline is counted
+
+    Raises:
+        EOFError: If a gzip file is truncated
+    """
+    lines = 0
+    last_byte = b"\n"
+    with open(path, "rb") as fh:
+        if not path.endswith(".gz"):
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                lines += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+        else:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            member_finished = True
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                while chunk:
+                    if decompressor.eof:
+                        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                    data = decompressor.decompress(chunk)
+                    member_finished = decompressor.eof
+                    chunk = decompressor.unused_data
+                    if data:
+                        lines += data.count(b"\n")
+                        last_byte = data[-1:]
+            if not member_finished:
+                raise EOFError(f"{path} is truncated")
+    if last_byte != b"\n":
+        lines += 1
+    return lines
+
+
+def count_reads(path: str) -> Dict:
+    """Counts the reads of a fastq file
+
+    Args:
+        path (str): path to a .fastq or .fastq.gz file
+
+    Returns:
+        Dict: {"path": path, "reads": number of reads or None, "error": reason the file is unreadable or None}
+    """
+    try:
+        lines = count_lines(path)
+    except (OSError, EOFError, zlib.error) as error:
+        return {"path": path, "reads": None, "error": str(error)}
+    if lines % 4 != 0:
+        return {"path": path, "reads": lines // 4, "error": f"{path} has {lines} lines which is not a multiple of 4"}
+    return {"path": path, "reads": lines // 4, "error": None}
+
+
+def check_read_pairs(read_pairs: Dict[str, Tuple[str, str]], min_reads: int = 0, processes: Optional[int] = None, cache: Optional[FileCache] = None, signatures: Optional[Dict[str, Tuple[int, int, int]]] = None) -> Dict[str, Dict]:
+    """Counts reads for every read pair with a process pool and checks the pairs
+
+    Args:
+        read_pairs (Dict[str, Tuple[str, str]]): sample name to (R1 path, R2 path)
+        min_reads (int, optional): minimum number of read pairs for a sample to pass. Defaults to 0.
+        processes (int, optional): number of worker processes, 1 runs in process. Defaults to None (cpu count).
+        cache (FileCache, optional): read counts of unchanged files are taken from and stored in the cache. Defaults to None.
+        signatures (Dict[str, Tuple[int, int, int]], optional): path to (size, mtime_ns, inode) from an earlier scan, saves a stat per cache lookup. Defaults to None.
+
+    Returns:
+        Dict[str, Dict]: sample name to {"read_counts": [R1, R2], "passed": bool, "reason": str or None}
+    """
+    paths: List[str] = [path for pair in read_pairs.values() for path in pair]
+    counts_by_path: Dict[str, Dict] = {}
+    if cache is not None:
+        for path in paths:
+            count = cache.get(path, "reads", signatures.get(path, None) if signatures is not None else None)
+            if count is not None:
+                counts_by_path[path] = count
+    paths_to_count = [path for path in paths if path not in counts_by_path]
+    if processes == 1 or len(paths_to_count) <= 2:
+        counts = [count_reads(path) for path in paths_to_count]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            counts = list(executor.map(count_reads, paths_to_count))
+    for count in counts:
+        counts_by_path[count["path"]] = count
+        if cache is not None and count["reads"] is not None: # unreadable or truncated files may still be copying, count them again next time
+            cache.set(count["path"], "reads", count, signatures.get(count["path"], None) if signatures is not None else None)
+
+    results = {}
+    for sample_name, pair in read_pairs.items():
+        read1, read2 = counts_by_path[pair[0]], counts_by_path[pair[1]]
+        reason = None
+        if read1["error"] is not None or read2["error"] is not None:
+            reason = "; ".join(error for error in (read1["error"], read2["error"]) if error is not None)
+        elif read1["reads"] != read2["reads"]:
+            reason = f"R1 has {read1['reads']} reads and R2 has {read2['reads']} reads"
+        elif read1["reads"] == 0:
+            reason = "no reads"
+        elif read1["reads"] < min_reads:
+            reason = f"{read1['reads']} reads is below the minimum of {min_reads}"
+        results[sample_name] = {
+            "read_counts": [read1["reads"], read2["reads"]],
+            "passed": reason is None,
+            "reason": reason
+        }
+    return results
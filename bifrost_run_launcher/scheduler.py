@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Slurm, SGE and PBS array job submissions for the shards of a run
+"""
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from bifrost_run_launcher import executor
+
+
+SUBMIT_NAME = "submit.sh"
+LOG_FOLDER = "logs"
+DEFAULT_RESOURCES = {"cpus": 1, "memory_gb": 4, "time_minutes": 60}
+
+# directives of a job, how to make it an array, the task index variable, how to submit, get the job id from the
+# submit output when it holds more and submit with a dependency and the most tasks of one array job (default MaxArraySize 1001, max_aj_tasks 75000 and max_array_size 10000)
+SCHEDULERS: Dict[str, Dict] = {
+    "slurm": {
+        "prefix": "#SBATCH",
+        "name": "--job-name={name}",
+        "log": "--output={log}",
+        "array_log": "--output={log}_%a",
+        "cpus": "--cpus-per-task={cpus}",
+        "memory_gb": "--mem={memory_gb}G",
+        "time_minutes": "--time={time}",
+        "queue": "--partition={queue}",
+        "account": "--account={account}",
+        "array": "--array=1-{tasks}",
+        "task_id": "SLURM_ARRAY_TASK_ID",
+        "submit": "sbatch --parsable",
+        "job_id": "cut -d';' -f1", # <id>;<cluster> on multi cluster setups
+        "depend": "--dependency=afterok:{job_id}",
+        "depend_separator": ":",
+        "max_array_size": 1000,
+    },
+    "sge": {
+        "prefix": "#$",
+        "name": "-N {name}",
+        "log": "-o {log} -j y",
+        "array_log": "-o {log}_$TASK_ID -j y",
+        "cpus": "-pe smp {cpus}",
+        "memory_gb": "-l h_vmem={memory_mb_per_cpu}M", # h_vmem is per slot
+        "time_minutes": "-l h_rt={time}",
+        "queue": "-q {queue}",
+        "account": "-A {account}",
+        "array": "-t 1-{tasks}",
+        "task_id": "SGE_TASK_ID",
+        "submit": "qsub -terse",
+        "job_id": "cut -d. -f1", # <id>.1-<tasks>:1 for array jobs
+        "depend": "-hold_jid {job_id}",
+        "depend_separator": ",",
+        "max_array_size": 75000,
+    },
+    "pbs": {
+        "prefix": "#PBS",
+        "name": "-N {name}",
+        "log": "-o {log} -j oe",
+        "array_log": "-o {log}_^array_index^ -j oe",
+        "cpus": "-l ncpus={cpus}",
+        "memory_gb": "-l mem={memory_gb}gb",
+        "time_minutes": "-l walltime={time}",
+        "queue": "-q {queue}",
+        "account": "-A {account}",
+        "array": "-J 1-{tasks}",
+        "task_id": "PBS_ARRAY_INDEX",
+        "submit": "qsub",
+        "depend": "-W depend=afterok:{job_id}",
+        "depend_separator": ":",
+        "max_array_size": 10000,
+    },
+}
+
+
+def get_resources(resource_hints: Dict[str, Dict], components: Optional[List[str]] = None) -> Dict:
+    """Resources of a job running the components, the largest hint of each resource over the components
+
+    Note:
+        resource_hints is the scheduler_resources option of config.yaml, a default entry and an entry per
+        component name with cpus, memory_gb, time_minutes and optionally queue and account. Components
+        without an entry use the default entry.
+
+    Args:
+        resource_hints (Dict[str, Dict]): resources by component name and default
+        components (List[str], optional): components run by the job. Defaults to None (the default entry).
+
+    Returns:
+        Dict: resources of the job
+    """
+    default = {**DEFAULT_RESOURCES, **resource_hints.get("default", {})}
+    if not components:
+        return default
+    resources = dict(default)
+    for key in DEFAULT_RESOURCES:
+        resources[key] = max(int(resource_hints.get(component, default).get(key, default[key])) for component in components)
+    return resources
+
+
+def _format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def _job_script(scheduler: str, name: str, log: str, resources: Dict, outdir: str, command: str, tasks: Optional[int] = None) -> str:
+    syntax = SCHEDULERS[scheduler]
+    values = {**resources, "name": name, "log": log, "time": _format_time(int(resources["time_minutes"])), "tasks": tasks,
+              "memory_mb_per_cpu": math.ceil(float(resources["memory_gb"]) * 1024 / max(int(resources["cpus"]), 1))}
+    directives = [syntax["name"], syntax["log"] if tasks is None else syntax["array_log"]]
+    directives += [syntax[key] for key in ("cpus", "memory_gb", "time_minutes", "queue", "account") if resources.get(key) is not None]
+    if tasks is not None:
+        directives.append(syntax["array"])
+    lines = ["#!/usr/bin/env bash"]
+    lines += [f"{syntax['prefix']} {directive.format(**values)}" for directive in directives]
+    lines += [f"cd \"{outdir}\"", command]
+    return "\n".join(lines) + "\n"
+
+
+def write_submission(outdir: str, scheduler: str, run_name: str, resource_hints: Optional[Dict[str, Dict]] = None, components: Optional[List[str]] = None) -> str:
+    """Writes array job scripts for the shards written by executor.write_shards and a script submitting them
+
+    Note:
+        Task i of the array job runs the shard on line i of the manifest, so with one sample per shard
+        each task is one sample. The pre script is submitted first, the array job depends on it and the
+        post script depends on all tasks of the array job. More shards than the scheduler allows in one
+        array are split over several array jobs (array_1, array_2, ...) of consecutive manifest lines.
+        Run shards/submit.sh from a login node to submit.
+
+    Args:
+        outdir (str): output directory of the run with the shards folder
+        scheduler (str): slurm, sge or pbs
+        run_name (str): run name, used for job names
+        resource_hints (Dict[str, Dict], optional): scheduler_resources option of config.yaml. Defaults to None.
+        components (List[str], optional): components of the per sample script, sizes the array tasks. Defaults to None.
+
+    Returns:
+        str: path of the submit script
+    """
+    if scheduler not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler {scheduler}, options are {', '.join(SCHEDULERS)}")
+    outdir = os.path.abspath(outdir)
+    shard_folder = os.path.join(outdir, executor.SHARD_FOLDER)
+    log_folder = os.path.join(shard_folder, LOG_FOLDER)
+    os.makedirs(log_folder, exist_ok=True)
+    resource_hints = resource_hints or {}
+    syntax = SCHEDULERS[scheduler]
+    tasks = len(executor.read_manifest(os.path.join(shard_folder, executor.MANIFEST_NAME)))
+
+    chunks = [(first, min(syntax["max_array_size"], tasks - first)) for first in range(0, tasks, syntax["max_array_size"])]
+
+    # (job, job script) in submission order, each step depends on all jobs of the step before
+    steps: List[List[Tuple[str, str]]] = []
+    if os.path.isfile(os.path.join(shard_folder, executor.PRE_SCRIPT_NAME)):
+        steps.append([("pre", _job_script(scheduler, f"{run_name}_pre", os.path.join(log_folder, "pre"), get_resources(resource_hints), outdir,
+                                            f"exec bash {executor.SHARD_FOLDER}/{executor.PRE_SCRIPT_NAME}"))])
+    array_jobs = []
+    for index, (first, chunk_tasks) in enumerate(chunks, start=1):
+        job = "array" if len(chunks) == 1 else f"array_{index}"
+        line = f"${{{syntax['task_id']}}}" if first == 0 else f"$(({first} + {syntax['task_id']}))"
+        command = (f"script=$(sed -n \"{line}p\" {executor.SHARD_FOLDER}/{executor.MANIFEST_NAME} | cut -f1)\n"
+                   f"exec bash \"$script\"")
+        array_jobs.append((job, _job_script(scheduler, f"{run_name}_samples", os.path.join(log_folder, job), get_resources(resource_hints, components), outdir, command, chunk_tasks)))
+    if len(array_jobs) > 0:
+        steps.append(array_jobs)
+    if os.path.isfile(os.path.join(shard_folder, executor.POST_SCRIPT_NAME)):
+        steps.append([("post", _job_script(scheduler, f"{run_name}_post", os.path.join(log_folder, "post"), get_resources(resource_hints), outdir,
+                                             f"exec bash {executor.SHARD_FOLDER}/{executor.POST_SCRIPT_NAME}"))])
+
+    submit = ["#!/usr/bin/env bash", "set -euo pipefail", f"cd \"{shard_folder}\""]
+    dependency = ""
+    for step in steps:
+        for job, job_script in step:
+            job_script_name = f"{job}.{scheduler}"
+            with open(os.path.join(shard_folder, job_script_name), "w") as fh:
+                fh.write(job_script)
+            job_id = f" | {syntax['job_id']}" if "job_id" in syntax else ""
+            submit.append(f"{job}_id=$({syntax['submit']} {dependency}{job_script_name}{job_id})")
+            submit.append(f"echo \"Submitted {job} job ${{{job}_id}}\"")
+        # on job ids, not names, as the jobs of an earlier launch of the run can still be queued under the same names
+        dependency = syntax["depend"].format(job_id=syntax["depend_separator"].join(f"${{{job}_id}}" for job, job_script in step)) + " "
+
+    submit_path = os.path.join(shard_folder, SUBMIT_NAME)
+    with open(submit_path, "w") as fh:
+        fh.write("\n".join(submit) + "\n")
+    return submit_path
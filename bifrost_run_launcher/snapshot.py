@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+run.yaml and samples.yaml snapshots of a launch, written as YAML documents one sample at a time
+"""
+import gzip
+import os
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+import yaml
+
+
+RUN_SNAPSHOT = "run.yaml"
+SAMPLES_SNAPSHOT = "samples.yaml"
+Dumper = yaml.CSafeDumper if hasattr(yaml, "CSafeDumper") else yaml.SafeDumper
+Loader = yaml.CSafeLoader if hasattr(yaml, "CSafeLoader") else yaml.SafeLoader
+
+
+def _open(path: str, mode: str) -> IO:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", compresslevel=6)
+    return open(path, mode)
+
+
+def _dump(document: Dict, fh: IO) -> None:
+    yaml.dump(document, fh, Dumper=Dumper, explicit_start=True, default_flow_style=False, sort_keys=False)
+
+
+def snapshot_paths(outdir: str = ".", compress: bool = False) -> Tuple[str, str]:
+    """Paths of the run and samples snapshot, with .gz when compressed"""
+    suffix = ".gz" if compress else ""
+    return (os.path.join(outdir, RUN_SNAPSHOT + suffix), os.path.join(outdir, SAMPLES_SNAPSHOT + suffix))
+
+
+def write_snapshot(run_json: Dict, samples_json: Iterable[Dict], outdir: str = ".", compress: bool = False) -> Tuple[str, str]:
+    """Writes the run as run.yaml and the samples as one YAML document each in samples.yaml
+
+    Note:
+        Samples are dumped one at a time so the file is written while samples_json is consumed. Snapshots
+        of the other compression are removed so read_snapshot doesn't pick up an older launch.
+
+    Args:
+        run_json (Dict): run.json
+        samples_json (Iterable[Dict]): sample.json of each sample of the run
+        outdir (str, optional): folder to write to. Defaults to ".".
+        compress (bool, optional): gzip the files, they are then named run.yaml.gz and samples.yaml.gz. Defaults to False.
+
+    Returns:
+        Tuple[str, str]: paths of the run and samples snapshot
+    """
+    run_path, samples_path = snapshot_paths(outdir, compress)
+    for stale_path in snapshot_paths(outdir, not compress):
+        if os.path.isfile(stale_path):
+            os.remove(stale_path)
+    with _open(run_path, "w") as fh:
+        _dump(run_json, fh)
+    with _open(samples_path, "w") as fh:
+        for sample_json in samples_json:
+            _dump(sample_json, fh)
+    return (run_path, samples_path)
+
+
+def iter_samples(samples_path: str) -> Iterator[Dict]:
+    """Yields the sample documents of a samples snapshot one at a time"""
+    with _open(samples_path, "r") as fh:
+        for document in yaml.load_all(fh, Loader=Loader):
+            if document is not None:
+                yield document
+
+
+def read_snapshot(outdir: str = ".") -> Optional[Tuple[Dict, List[Dict]]]:
+    """Reads the run and samples snapshot in outdir, compressed or not
+
+    Returns:
+        Optional[Tuple[Dict, List[Dict]]]: run json and sample jsons, None when there is no complete snapshot
+    """
+    for compress in (False, True):
+        run_path, samples_path = snapshot_paths(outdir, compress)
+        if os.path.isfile(run_path) and os.path.isfile(samples_path):
+            with _open(run_path, "r") as fh:
+                run_json = yaml.load(fh, Loader=Loader)
+            return (run_json, list(iter_samples(samples_path)))
+    return None
@@ -0,0 +1,16 @@
+"""
+Fixtures shared by the tests and the benchmarks, fixtures only the tests use are in tests/conftest.py
+"""
+import pytest
+from bifrostlib import database_interface
+
+
+@pytest.fixture
+def db():
+    """In-process mongomock database wired into bifrostlib, with the unique sample name index of a bifrost DB, so launches can be tested without a live MongoDB."""
+    mongomock = pytest.importorskip("mongomock") # from the test extra
+    connection = database_interface.CONNECTION
+    database_interface.CONNECTION = mongomock.MongoClient("mongodb://localhost/bifrost_test")
+    database_interface.index_field("sample", "name", unique=True)
+    yield database_interface.CONNECTION.get_database()
+    database_interface.CONNECTION = connection
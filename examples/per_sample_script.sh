@@ -2,7 +2,7 @@
 echo "Running $sample.name from $run.name";
 BIFROST_RAW_DATA_MNT="/raw_data/mnt";
 BIFROST_PIPELINE_TOOLS="/tools/singularity";
-mkdir $sample.name;
+mkdir -p $sample.name;
 cd $sample.name;
 docker run -B \
 $BIFROST_RAW_DATA_MNT,\
@@ -1,3 +1,3 @@
 # Post-script example
-echo "start post_script $run.name;
+echo "start post_script $run.name";
 echo "end post_script";
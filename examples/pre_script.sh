@@ -1,3 +1,3 @@
 # Pre-script example
-echo "start pre_script $run.name;
+echo "start pre_script $run.name";
 echo "end pre_script";
@@ -11,6 +11,10 @@ setup(
     install_requires=[
         'bifrostlib >= 2.1.9',
     ],
+    extras_require={
+        'arrow': ['pyarrow'],
+        'test': ['mongomock'],
+    },
     package_data={"bifrost_run_launcher": ['config.yaml']},
     include_package_data=True
     )
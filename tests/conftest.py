@@ -0,0 +1,45 @@
+"""
+Fixtures shared by the test modules, the db fixture is in the conftest.py at the root shared with the benchmarks
+"""
+import os
+import pytest
+from bifrost_run_launcher import launcher
+
+
+@pytest.fixture
+def run_folder(tmp_path):
+    """Factory fixture writing a run folder in tmp_path with empty paired read files in its reads subfolder and a run_metadata.tsv for n samples.
+
+    With complete the CopyComplete.txt marker the daemon waits for is written too.
+    """
+    def _run_folder(name: str, n_samples: int = 0, reads: str = "", complete: bool = False):
+        folder = tmp_path / name
+        (folder / reads).mkdir(parents=True, exist_ok=True)
+        with open(folder / "run_metadata.tsv", "w") as fh:
+            fh.write("sample_name\tprovided_species\tfilenames\n")
+            for i in range(n_samples):
+                (folder / reads / f"S{i}_R1.fastq.gz").touch()
+                (folder / reads / f"S{i}_R2.fastq.gz").touch()
+                fh.write(f"S{i}\tStaphylococcus aureus\tS{i}_R1.fastq.gz/S{i}_R2.fastq.gz\n")
+        if complete:
+            (folder / "CopyComplete.txt").touch()
+        return folder
+    return _run_folder
+
+
+@pytest.fixture
+def installed_component(monkeypatch):
+    """The component from config.yaml as installed, set without a DB as launcher.initialize would"""
+    config = launcher.load_config()
+    config["_id"] = {"$oid": "0" * 24}
+    monkeypatch.setattr(launcher, "COMPONENT", config, raising=False)
+    return config
+
+
+@pytest.fixture
+def launcher_args(tmp_path):
+    """Launcher arguments with the example pre/post scripts and a per sample script, as given to every run folder launch"""
+    examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+    (tmp_path / "per_sample.sh").write_text("run $sample.display_name\n")
+    return ["--pre_script", os.path.join(examples, "pre_script.sh"), "--per_sample_script", str(tmp_path / "per_sample.sh"),
+            "--post_script", os.path.join(examples, "post_script.sh"), "--run_type", "test"]
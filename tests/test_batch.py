@@ -0,0 +1,45 @@
+import os
+import pytest
+from bifrost_run_launcher import batch
+
+
+def test_expand_run_folders(tmp_path, run_folder):
+    for name in ["run_b", "run_a", "other"]:
+        run_folder(f"runs/{name}", 0, reads="samples")
+    (tmp_path / "runs" / "run_file").touch()
+    runs = tmp_path / "runs"
+    assert batch.expand_run_folders([str(runs / "other"), str(runs / "run_*"), str(runs / "run_a")]) == [
+        str(runs / "other"), str(runs / "run_a"), str(runs / "run_b")]
+    with pytest.raises(ValueError):
+        batch.expand_run_folders([str(runs / "missing_*")])
+
+
+def test_batch_launches_every_run_and_reports_failures(db, installed_component, run_folder, launcher_args, tmp_path, capsys):
+    run_folder("runs/run_a", 3, reads="samples")
+    run_folder("runs/run_b", 2, reads="samples")
+    (run_folder("runs/run_broken", 1, reads="samples") / "run_metadata.tsv").write_text("no sample columns\n")
+    cwd = os.getcwd()
+    results = batch.run_batch([str(tmp_path / "runs" / "*")], launcher_args)
+    assert os.getcwd() == cwd
+    assert [(os.path.basename(result["run_folder"]), result["status"], result["samples"]) for result in results] == [
+        ("run_a", batch.DONE, 3), ("run_b", batch.DONE, 2), ("run_broken", batch.FAILED, None)]
+    assert results[2]["error"] is not None
+    assert db.runs.find_one({"name": "run_a"})["path"] == str(tmp_path / "runs" / "run_a")
+    for name in ["run_a", "run_b"]:
+        assert os.path.isfile(tmp_path / "runs" / name / "run_script.sh")
+        assert os.path.isfile(tmp_path / "runs" / name / "launch_report.json")
+    assert "Traceback" in (tmp_path / "runs" / "run_broken" / batch.LOG_NAME).read_text()
+    summary = capsys.readouterr().out.splitlines()
+    assert summary[-5].split() == ["run", "status", "samples", "seconds", "error"]
+    assert summary[-4].split()[:3] == ["run_a", "done", "3"]
+    assert summary[-1] == "2 of 3 runs launched, 1 failed"
+
+
+def test_folder_without_metadata_fails_without_stopping_the_batch(db, installed_component, run_folder, launcher_args, tmp_path, capsys):
+    (run_folder("runs/run_a", 1, reads="samples") / "run_metadata.tsv").unlink()
+    run_folder("runs/run_b", 2, reads="samples")
+    results = batch.run_batch([str(tmp_path / "runs" / "*")], launcher_args)
+    assert [(result["status"], result["samples"]) for result in results] == [(batch.FAILED, None), (batch.DONE, 2)]
+    assert results[0]["error"] == "SystemExit: 2"
+    assert "run_metadata.tsv #Bad file path" in (tmp_path / "runs" / "run_a" / batch.LOG_NAME).read_text()
+    assert capsys.readouterr().out.splitlines()[-1] == "1 of 2 runs launched, 1 failed"
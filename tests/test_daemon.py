@@ -0,0 +1,123 @@
+import json
+import threading
+from bifrost_run_launcher import daemon
+
+
+class FakeLaunch:
+    def __init__(self, fail=(), error=RuntimeError("launch failed")):
+        self.launched = []
+        self.resumed = []
+        self.fail = fail
+        self.error = error
+        self.lock = threading.Lock()
+
+    def __call__(self, run_folder, resume=False):
+        with self.lock:
+            self.launched.append(run_folder)
+            if resume:
+                self.resumed.append(run_folder)
+        if run_folder.endswith(self.fail):
+            raise self.error
+
+
+def wait(watcher):
+    for future in list(watcher.futures.values()):
+        future.result()
+
+
+def test_runs_launch_once_after_settling(tmp_path, run_folder):
+    root = tmp_path
+    run_folder("run1", complete=True)
+    run_folder("copying", complete=False)
+    launch = FakeLaunch()
+    watcher = daemon.Daemon(str(root), launch, workers=2, settle=30)
+    assert watcher.check(now=0) == []
+    assert watcher.check(now=10) == []
+    (root / "run1" / "run_metadata.tsv").write_text("sample_name\tprovided_species\tfilenames\nS1\tE. coli\tS1_R1.fq.gz/S1_R2.fq.gz\n")
+    assert watcher.check(now=35) == [] # metadata changed, wait again
+    assert watcher.check(now=70) == ["run1"]
+    assert watcher.check(now=200) == []
+    wait(watcher)
+    assert launch.launched == [str(root / "run1")]
+    assert watcher.queue.state("run1") == daemon.DONE
+    assert watcher.queue.state("copying") is None
+
+
+def test_queue_survives_restart(tmp_path, run_folder):
+    root = tmp_path
+    for name in ["done", "interrupted", "failed"]:
+        run_folder(name, complete=True)
+    (root / daemon.QUEUE_NAME).write_text(json.dumps({
+        "done": {"state": daemon.DONE}, "interrupted": {"state": daemon.RUNNING}, "failed": {"state": daemon.FAILED},
+    }))
+    launch = FakeLaunch(fail="interrupted")
+    watcher = daemon.Daemon(str(root), launch, settle=0)
+    wait(watcher)
+    assert launch.launched == [str(root / "interrupted")]
+    assert watcher.check() == []
+    with open(root / daemon.QUEUE_NAME) as fh:
+        queue = json.load(fh)
+    assert queue["interrupted"]["state"] == daemon.FAILED and "launch failed" in queue["interrupted"]["error"]
+
+    launch = FakeLaunch()
+    wait(daemon.Daemon(str(root), launch, settle=0, retry_failed=True))
+    assert sorted(launch.launched) == [str(root / "failed"), str(root / "interrupted")]
+    assert sorted(launch.resumed) == [str(root / "failed"), str(root / "interrupted")] # an earlier launch may have saved part of them
+
+
+def test_only_started_runs_are_resumed(tmp_path, run_folder):
+    for name in ["queued", "queued_to_resume", "interrupted"]:
+        run_folder(name, complete=True)
+    (tmp_path / daemon.QUEUE_NAME).write_text(json.dumps({
+        "queued": {"state": daemon.QUEUED}, "queued_to_resume": {"state": daemon.QUEUED, "resume": True}, "interrupted": {"state": daemon.RUNNING},
+    }))
+    launch = FakeLaunch()
+    wait(daemon.Daemon(str(tmp_path), launch, settle=0))
+    assert sorted(launch.launched) == [str(tmp_path / name) for name in ["interrupted", "queued", "queued_to_resume"]]
+    assert sorted(launch.resumed) == [str(tmp_path / "interrupted"), str(tmp_path / "queued_to_resume")]
+
+
+def test_resumed_launch_reuses_the_saved_run(db, installed_component, run_folder, launcher_args):
+    folder = str(run_folder("run1", 3))
+    daemon.launch_run_folder(folder, launcher_args)
+    run_document = db.runs.find_one({"name": "run1"})
+    sample_ids = {sample["_id"] for sample in db.samples.find()}
+    daemon.launch_run_folder(folder, launcher_args, resume=True)
+    assert db.runs.count_documents({"name": "run1"}) == 1
+    assert db.runs.find_one({"name": "run1"})["_id"] == run_document["_id"]
+    assert {sample["_id"] for sample in db.samples.find()} == sample_ids
+    assert [sample["_id"] for sample in db.runs.find_one({"name": "run1"})["samples"]] == [sample["_id"] for sample in run_document["samples"]]
+
+
+def test_stop_cancels_queued_launches(tmp_path, run_folder):
+    started, release = threading.Event(), threading.Event()
+    def launch(run_folder, resume):
+        started.set()
+        release.wait(10)
+    watcher = daemon.Daemon(str(tmp_path), launch, workers=1, settle=0)
+    for name in ["run1", "run2"]:
+        run_folder(name, complete=True)
+    assert watcher.check() == ["run1", "run2"]
+    started.wait(10)
+    threading.Timer(0.2, release.set).start()
+    watcher.stop()
+    assert watcher.queue.state("run1") == daemon.DONE
+    assert watcher.futures["run2"].cancelled()
+    assert watcher.queue.state("run2") == daemon.QUEUED
+
+
+def test_invalid_launch_options_fail_the_run(tmp_path, run_folder):
+    run_folder("no_metadata", complete=True)
+    watcher = daemon.Daemon(str(tmp_path), FakeLaunch(fail="no_metadata", error=SystemExit(2)), settle=0)
+    assert watcher.check() == ["no_metadata"]
+    wait(watcher)
+    assert watcher.queue.state("no_metadata") == daemon.FAILED
+
+
+def test_touch_maps_events_to_run_folders(tmp_path):
+    root = tmp_path
+    watcher = daemon.Daemon(str(root), FakeLaunch())
+    watcher.touch(str(root / "run1" / "Data" / "file.bcl"))
+    watcher.touch(str(root / daemon.QUEUE_NAME))
+    watcher.touch(str(root.parent / "elsewhere"))
+    assert watcher.touched == {"run1"}
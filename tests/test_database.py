@@ -0,0 +1,58 @@
+import threading
+import pytest
+import mongomock
+from pymongo.errors import AutoReconnect
+from bifrostlib import database_interface
+from bifrost_run_launcher import database
+from bifrost_run_launcher import instrumentation
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = mongomock.MongoClient("mongodb://localhost/bifrost_test")
+    monkeypatch.setattr(database_interface, "CONNECTION", connection)
+    yield connection
+
+
+def test_connection_is_shared_with_bifrostlib(connection):
+    assert database.connect() is connection
+    assert database_interface.get_connection() is connection
+
+
+def test_name_exists(connection):
+    database.get_collection("run").insert_one({"name": "run1"})
+    assert database.name_exists("run", "run1")
+    assert not database.name_exists("run", "run2")
+
+
+def test_with_retry(monkeypatch):
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    monkeypatch.setenv("BIFROST_DB_RETRIES", "2")
+    calls = []
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise AutoReconnect("connection reset")
+        return "done"
+    assert database.with_retry(flaky) == "done"
+    calls.clear()
+    monkeypatch.setenv("BIFROST_DB_RETRIES", "1")
+    with pytest.raises(AutoReconnect):
+        database.with_retry(flaky)
+
+
+def test_connect_counts_commands_in_the_driver(monkeypatch):
+    monkeypatch.setattr(database_interface, "CONNECTION", None)
+    monkeypatch.setenv("BIFROST_DB_KEY", "mongodb://localhost:1/bifrost_test")
+    client = database.connect()
+    try:
+        counters = [listener for listener in client.options.event_listeners if isinstance(listener, database.RoundTripCounter)]
+        assert len(counters) == 1
+    finally:
+        client.close()
+    launch = instrumentation.reset()
+    counters[0].started(None)
+    writer = threading.Thread(target=instrumentation.run_in, args=(launch, counters[0].started, None)) # e.g. a DB writer thread
+    writer.start()
+    writer.join()
+    assert launch.counters["db_round_trips"] == 2
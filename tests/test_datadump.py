@@ -0,0 +1,48 @@
+import json
+import pytest
+import mongomock
+from bson import ObjectId
+from bifrostlib import database_interface
+from bifrost_run_launcher import datadump
+
+
+@pytest.fixture
+def run(monkeypatch):
+    '''Run with 7 samples in a mongomock DB, one referenced by name only and one not in the DB.'''
+    connection = mongomock.MongoClient("mongodb://localhost/bifrost_test")
+    monkeypatch.setattr(database_interface, "CONNECTION", connection)
+    db = connection.get_database()
+    samples = [{"_id": ObjectId(), "name": f"dump___S{i}", "display_name": f"S{i}",
+                "categories": {"sample_info": {"summary": {"sample_name": f"S{i}", "priority": i}}}} for i in range(6)]
+    db.samples.insert_many(samples)
+    references = [{"_id": sample["_id"], "name": sample["name"]} for sample in samples[1:]]
+    references += [{"name": samples[0]["name"]}, {"_id": ObjectId(), "name": "dump___missing"}]
+    db.runs.insert_one({"name": "dump", "samples": references})
+    return datadump.load_run(name="dump")
+
+
+def test_ndjson(run, tmp_path):
+    paths = datadump.dump_run(run, str(tmp_path / "dump"), batch_size=2)
+    with open(paths["samples"]) as fh:
+        samples = [json.loads(line) for line in fh]
+    assert sorted(sample["display_name"] for sample in samples) == [f"S{i}" for i in range(6)]
+    assert "$oid" in samples[0]["_id"]
+    with open(paths["run"]) as fh:
+        assert json.load(fh)["name"] == "dump"
+
+
+def test_ndjson_projection(run, tmp_path):
+    paths = datadump.dump_run(run, str(tmp_path / "dump"), fields=["name"])
+    with open(paths["samples"]) as fh:
+        assert all(set(json.loads(line)) == {"_id", "name"} for line in fh)
+
+
+def test_parquet(run, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    paths = datadump.dump_run(run, str(tmp_path / "dump"), "parquet", batch_size=4)
+    parquet_file = pq.ParquetFile(paths["samples"])
+    assert parquet_file.num_row_groups == 2
+    table = parquet_file.read().to_pydict()
+    assert table["categories.paired_reads.summary"] == [None] * 6
+    assert sorted(json.loads(summary)["priority"] for summary in table["categories.sample_info.summary"]) == list(range(6))
+    assert all(len(_id) == 24 for _id in table["_id"])
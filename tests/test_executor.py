@@ -0,0 +1,76 @@
+import os
+import pytest
+from bifrost_run_launcher import executor
+
+
+@pytest.fixture
+def outdir(tmp_path):
+    '''Run output directory with shards where samples named fail* exit with 1 until a ok file exists.'''
+    blocks = [(f"S{i}", f"echo S{i} >> samples.txt\n") for i in range(5)]
+    blocks.append(("fail0", "echo fail0 >> samples.txt\ntest -f ok\n"))
+    executor.write_shards(str(tmp_path), blocks, pre_script="echo pre >> samples.txt\n", post_script="echo post >> samples.txt\n", samples_per_shard=2)
+    return tmp_path
+
+
+class TestWriteShards:
+    def test_manifest(self, outdir):
+        shards = executor.read_manifest(os.path.join(outdir, executor.SHARD_FOLDER, executor.MANIFEST_NAME))
+        assert shards == [
+            ("shards/shard_00000.sh", ["S0", "S1"]),
+            ("shards/shard_00001.sh", ["S2", "S3"]),
+            ("shards/shard_00002.sh", ["S4", "fail0"]),
+        ]
+        assert all(os.path.isfile(os.path.join(outdir, script)) for script, sample_names in shards)
+
+    def test_failed_render_keeps_previous_shards(self, outdir):
+        shard_folder = outdir / executor.SHARD_FOLDER
+        previous = {name: (shard_folder / name).read_text() for name in os.listdir(shard_folder)}
+        def blocks():
+            yield ("S0", "echo new S0\n")
+            yield ("S1", "echo new S1\n")
+            yield ("S2", "echo new S2\n")
+            raise KeyError("$sample.missing")
+        with pytest.raises(KeyError):
+            executor.write_shards(str(outdir), blocks(), pre_script="echo new pre\n", samples_per_shard=1)
+        assert {name: (shard_folder / name).read_text() for name in os.listdir(shard_folder)} == previous
+
+    def test_relaunch_with_fewer_shards_removes_the_stale_ones(self, outdir):
+        executor.execute_manifest(str(outdir), jobs=1)
+        shard_folder = outdir / executor.SHARD_FOLDER
+        assert os.path.isfile(shard_folder / "shard_00002.sh.exit")
+        executor.write_shards(str(outdir), [("S0", "echo S0\n"), ("S1", "echo S1\n")], samples_per_shard=1)
+        assert sorted(name for name in os.listdir(shard_folder) if name.endswith(".sh")) == ["shard_00000.sh", "shard_00001.sh"]
+        assert not any(name.startswith("shard_00002") for name in os.listdir(shard_folder)) # nor its .exit, .samples and .log
+
+    def test_invalid_shard_size(self, tmp_path):
+        with pytest.raises(ValueError):
+            executor.write_shards(str(tmp_path), [], samples_per_shard=0)
+
+
+class TestExecuteManifest:
+    def test_failed_shards_are_retried(self, outdir):
+        status = executor.execute_manifest(str(outdir), jobs=2)
+        assert status == {"S0": 0, "S1": 0, "S2": 0, "S3": 0, "S4": 0, "fail0": 1}
+        lines = (outdir / "samples.txt").read_text().split()
+        assert lines[0] == "pre" and "post" not in lines
+        (outdir / "ok").touch()
+        (outdir / "samples.txt").unlink()
+        assert set(executor.execute_manifest(str(outdir), jobs=2).values()) == {0}
+        assert (outdir / "samples.txt").read_text().split() == ["S4", "fail0", "post"]
+        assert "S4\tshards/shard_00002.sh\t0" in (outdir / executor.SHARD_FOLDER / executor.STATUS_NAME).read_text()
+
+    def test_command_failing_partway_fails_its_sample(self, tmp_path):
+        blocks = [("S0", "echo S0 >> samples.txt\nfalse\necho S0 done >> samples.txt\n"),
+                  ("S1", "false | cat\necho S1 done >> samples.txt\n"),
+                  ("S2", "cd missing_folder\n"),
+                  ("S3", "echo S3 done >> samples.txt\n")]
+        executor.write_shards(str(tmp_path), blocks, samples_per_shard=4)
+        status = executor.execute_manifest(str(tmp_path), jobs=1)
+        assert status == {"S0": 1, "S1": 1, "S2": 1, "S3": 0}
+        assert executor.read_exit_status(os.path.join(tmp_path, "shards", "shard_00000.sh")) == 1
+        assert (tmp_path / "samples.txt").read_text().splitlines() == ["S0", "S3 done"]
+
+    def test_exit_status_without_executor(self, outdir):
+        script = os.path.join(outdir, "shards", "shard_00000.sh")
+        os.system(f"cd {outdir} && bash {script}")
+        assert executor.read_exit_status(script) == 0
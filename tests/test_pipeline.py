@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import re
+import pytest
+from bifrostlib import database_interface
+from bifrostlib.datahandling import Run
+from bifrostlib.datahandling import Sample
+from bifrost_run_launcher import pipeline
+from bifrost_run_launcher import snapshot
+
+
+@pytest.fixture
+def component():
+    return {"_id": {"$oid": "0" * 24}, "name": "run_launcher__test"}
+
+
+class TestSaveSamples:
+    def test_bulk_insert(self, db):
+        run = Run(name="bulk_run")
+        samples = [Sample(name=run.sample_name_generator(f"S{i}")) for i in range(5)]
+        pipeline.save_samples(samples, batch_size=2)
+        assert all("_id" in sample.json for sample in samples)
+        assert db.samples.count_documents({}) == 5
+
+    def test_duplicates_are_reported(self, db, capsys):
+        run = Run(name="bulk_run")
+        existing = [Sample(name=run.sample_name_generator(f"S{i}")) for i in range(3)]
+        pipeline.save_samples(existing)
+        samples = [Sample(name=run.sample_name_generator(f"S{i}")) for i in range(2, 4)] + existing[:1]
+        pipeline.save_samples(samples)
+        assert "Sample bulk_run___S2 exists - reusing" in capsys.readouterr().out
+        assert "_id" not in samples[0].json
+        assert "_id" in samples[1].json
+        assert samples[2]["_id"] == existing[0]["_id"]
+        assert db.samples.count_documents({}) == 4
+
+    def test_pipelined_writes_from_generator(self, db, capsys, monkeypatch):
+        run = Run(name="bulk_run")
+        pipeline.save_samples([Sample(name=run.sample_name_generator(f"S{i}")) for i in (1, 5)])
+        capsys.readouterr()
+        writes = []
+        write_batch = pipeline._write_batch
+        def _write_batch(collection, operations):
+            writes.append(len(operations))
+            return write_batch(collection, operations)
+        monkeypatch.setattr(pipeline, "_write_batch", _write_batch)
+        built = []
+        def build():
+            for i in range(7):
+                built.append(i)
+                yield Sample(name=run.sample_name_generator(f"S{i}"))
+        samples = pipeline.save_samples(build(), batch_size=2, writers=2)
+        assert [sample["name"] for sample in samples] == [run.sample_name_generator(f"S{i}") for i in range(7)]
+        assert built == list(range(7)) and writes == [2, 2, 2, 1]
+        assert capsys.readouterr().out == "Sample bulk_run___S1 exists - reusing\nSample bulk_run___S5 exists - reusing\n"
+        assert ["_id" in sample.json for sample in samples] == [True, False, True, True, True, False, True]
+        assert db.samples.count_documents({}) == 7
+
+
+class TestLoadSamples:
+    def _saved_samples(self, run, count):
+        samples = []
+        for i in range(count):
+            sample = Sample(name=run.sample_name_generator(f"S{i}"))
+            sample["categories"] = {"sample_info": {"summary": {"sample_name": f"S{i}"}}}
+            samples.append(sample)
+        return pipeline.save_samples(samples)
+
+    def test_load_in_reference_order(self, db):
+        run = Run(name="load_run")
+        samples = self._saved_samples(run, 10)
+        references = [sample.to_reference() for sample in reversed(samples)]
+        loaded = pipeline.load_samples(references)
+        assert [sample["name"] for sample in loaded] == [sample["name"] for sample in reversed(samples)]
+
+    def test_subset_is_pushed_into_query(self, db):
+        run = Run(name="load_run")
+        samples = self._saved_samples(run, 10)
+        loaded = pipeline.load_samples([sample.to_reference() for sample in samples], sample_subset={"S3", "S7", "missing"})
+        assert [sample["name"] for sample in loaded] == ["load_run___S3", "load_run___S7"]
+
+
+class TestExistingSamples:
+    def test_index_thousands_of_samples(self):
+        run = Run(name="big_run")
+        samples = [{"name": run.sample_name_generator(f"S{i}"), "_id": i} for i in range(5000)]
+        existing_samples = pipeline.index_samples_by_name(samples)
+        assert len(existing_samples) == 5000
+        assert existing_samples[run.sample_name_generator("S4321")]["_id"] == 4321
+        assert "S4321" not in existing_samples
+
+    def test_initialize_run_reuses_existing_samples(self, db, component, run_folder, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        folder = run_folder("reads", 20)
+        initialize_args = dict(component=component, input_folder=str(folder), run_metadata=str(folder / "run_metadata.tsv"), run_type="test")
+        run, samples, run_mode = pipeline.initialize_run(run=Run(name="rerun"), samples=[], **initialize_args)
+        first_ids = {sample["name"]: sample["_id"] for sample in samples}
+
+        run, samples, run_mode = pipeline.initialize_run(run=run, samples=pipeline.load_samples(run.samples), **initialize_args)
+        assert {sample["name"]: sample["_id"] for sample in samples} == first_ids
+        assert db.samples.count_documents({}) == 20
+
+
+class TestScriptTemplate:
+    examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+    def _legacy_run_script(self, run, samples, pre, per, post):
+        script = ""
+        with open(pre) as fh:
+            script = script + pipeline.replace_run_info_in_script(fh.read(), run)
+        with open(per) as fh:
+            per_sample_script = pipeline.replace_run_info_in_script(fh.read(), run)
+        for sample in samples:
+            script = script + pipeline.replace_sample_info_in_script(per_sample_script, sample)
+        with open(post) as fh:
+            script = script + pipeline.replace_run_info_in_script(fh.read(), run)
+        return script
+
+    def _samples(self, run, count):
+        samples = []
+        for i in range(count):
+            sample = Sample(name=run.sample_name_generator(f"S{i}"))
+            sample["_id"] = {"$oid": f"{i:024d}"}
+            sample["properties"] = {"paired_reads": {"summary": {"data": [f"/reads/S{i}_R1.fastq.gz", f"/reads/S{i}_R2.fastq.gz"]}}}
+            sample["categories"] = {"sample_info": {"summary": {"sample_name": f"S{i}", "priority": i, "comments": None, "note": f"$sample.name{i}"}}}
+            samples.append(sample)
+        return samples
+
+    @pytest.mark.parametrize("per_sample_script", [
+        None,
+        "echo $sample.categories.sample_info.summary.priority $sample.categories.sample_info.summary.comments;\n",
+        "echo $sample.name $sample.name_suffix $sample.name;\n",
+        "echo $sample.categories.sample_info.summary.note $sample.name;\n",
+        "echo $sam$sample.name $sample._id;\n",
+    ])
+    def test_byte_identical_to_legacy_renderer(self, tmp_path, per_sample_script):
+        run = Run(name="template_run")
+        samples = self._samples(run, 5)
+        for sample in samples:
+            sample["name_suffix"] = "suffix"
+        pre = os.path.join(self.examples, "pre_script.sh")
+        post = os.path.join(self.examples, "post_script.sh")
+        per = os.path.join(self.examples, "per_sample_script.sh")
+        if per_sample_script is not None:
+            per = tmp_path / "per_sample_script.sh"
+            per.write_text(per_sample_script)
+        expected = self._legacy_run_script(run, samples, pre, per, post)
+        assert pipeline.generate_run_script(run, samples, pre, per, post) == expected
+        pipeline.write_run_script(run, samples, pre, per, post, tmp_path / "run_script.sh")
+        assert (tmp_path / "run_script.sh").read_bytes() == expected.encode()
+
+    def test_failed_render_keeps_previous_script(self, tmp_path):
+        run = Run(name="template_run")
+        samples = self._samples(run, 3)
+        pre = os.path.join(self.examples, "pre_script.sh")
+        post = os.path.join(self.examples, "post_script.sh")
+        per = tmp_path / "per_sample_script.sh"
+        per.write_text("echo $sample.name\n")
+        pipeline.write_run_script(run, samples, pre, str(per), post, str(tmp_path / "run_script.sh"))
+        previous = (tmp_path / "run_script.sh").read_text()
+        for sample in samples[:2]:
+            sample["name_suffix"] = "suffix"
+        per.write_text("echo $sample.name_suffix\n")
+        with pytest.raises(pipeline.PlaceholderError):
+            pipeline.write_run_script(run, samples, pre, str(per), post, str(tmp_path / "run_script.sh"))
+        assert (tmp_path / "run_script.sh").read_text() == previous
+        assert sorted(os.listdir(tmp_path)) == ["per_sample_script.sh", "run_script.sh"]
+
+    def test_placeholders_are_compiled_once_per_path(self):
+        template = pipeline.ScriptTemplate("cp $sample.properties.paired_reads.summary.data[0] $sample._id/;\n" * 50)
+        assert [accessor.steps for accessor in template.accessors] == [
+            ["properties", "paired_reads", "summary", "data", 0], ["_id", "$oid"]]
+        assert pipeline.ScriptTemplate("$sample._id").accessors[0] is template.accessors[1]
+        sample = self._samples(Run(name="template_run"), 1)[0]
+        assert template.render(sample).startswith(f"cp /reads/S0_R1.fastq.gz {'0' * 24}/;\n")
+
+    @pytest.mark.parametrize("item, problem", [
+        ("$sample.categories.paired_reads.summary.data", "no key 'paired_reads' in $sample.categories"),
+        ("$sample.properties.paired_reads.summary.data[2]", "index 2 out of range, $sample.properties.paired_reads.summary.data has 2 items"),
+        ("$sample.categories.sample_info.summary.comments.text", "$sample.categories.sample_info.summary.comments is NoneType, not an object"),
+    ])
+    def test_missing_placeholder_paths(self, item, problem):
+        sample = self._samples(Run(name="template_run"), 1)[0]
+        with pytest.raises(KeyError, match=re.escape(f"{item} not found in sample {sample['name']}: {problem}")):
+            pipeline.ScriptTemplate(f"echo {item}\n").render(sample)
+
+
+class TestReadCheck:
+    def test_failing_samples_are_left_out_of_script(self, db, component, run_folder, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        folder = run_folder("reads", 3)
+        with open(folder / "S0_R1.fastq", "w") as fh:
+            fh.write("@r\nA\n+\nI\n")
+        with open(folder / "S0_R2.fastq", "w") as fh:
+            fh.write("@r\nA\n+\nI\n")
+        with open(folder / "run_metadata.tsv", "a") as fh:
+            fh.write("S3\tStaphylococcus aureus\tS0_R1.fastq/S0_R2.fastq\n")
+        run, samples, run_mode = pipeline.initialize_run(run=Run(name="read_check"), samples=[], component=component,
+                                                         input_folder=str(folder), run_metadata=str(folder / "run_metadata.tsv"), run_type="test",
+                                                         check_reads=True, processes=1)
+        assert [sample["display_name"] for sample in samples] == ["S3"]
+        assert samples[0]["categories"]["paired_reads"]["summary"]["read_counts"] == [1, 1]
+        assert sorted(run["issues"]["samples_failing_read_check"]) == ["S0", "S1", "S2"]
+        assert len(run.samples) == 4
+
+
+class TestIncremental:
+    def test_only_changed_samples_are_saved_and_returned(self, db, component, run_folder, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        folder = run_folder("reads", 10)
+        initialize_args = dict(component=component, input_folder=str(folder), run_metadata=str(folder / "run_metadata.tsv"), run_type="test")
+        run, samples, run_mode = pipeline.initialize_run(run=Run(name="incremental"), samples=[], **initialize_args)
+        updated_at = {sample["name"]: sample["metadata"]["updated_at"] for sample in samples}
+
+        metadata = (folder / "run_metadata.tsv").read_text().replace("S4\tStaphylococcus aureus", "S4\tStaphylococcus epidermidis")
+        (folder / "run_metadata.tsv").write_text(metadata + "S10\tStaphylococcus aureus\tS10_R1.fastq.gz/S10_R2.fastq.gz\n")
+        (folder / "S10_R1.fastq.gz").touch()
+        (folder / "S10_R2.fastq.gz").touch()
+        run, samples, run_mode = pipeline.initialize_run(run=run, samples=pipeline.load_samples(run.samples), incremental=True, **initialize_args)
+
+        assert [sample["display_name"] for sample in samples] == ["S4", "S10"]
+        assert samples[0]["categories"]["sample_info"]["summary"]["provided_species"] == "Staphylococcus epidermidis"
+        assert len(run.samples) == 11
+        unchanged = db.samples.find_one({"name": "incremental___S0"})
+        assert database_interface.bson_to_json(unchanged)["metadata"]["updated_at"] == updated_at["incremental___S0"]
+
+
+class TestMixedRun:
+    def test_reads_and_assemblies_in_one_run(self, db, component, run_folder, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        folder = run_folder("reads", 2)
+        (folder / "A0.fasta").write_text(">contig\nACGT\n")
+        with open(folder / "run_metadata.tsv", "a") as fh:
+            fh.write("A0\tStaphylococcus aureus\tA0.fasta\n")
+            fh.write("A1\tStaphylococcus aureus\tA1.fasta\n")
+        run, samples, run_mode = pipeline.initialize_run(run=Run(name="mixed"), samples=[], component=component,
+                                                         input_folder=str(folder), run_metadata=str(folder / "run_metadata.tsv"), run_type="test")
+        assert run_mode == "MIXED"
+        assert [pipeline.get_sample_mode(sample) for sample in samples] == ["SEQ", "SEQ", "ASM"]
+        assert "species_detection" in samples[2]["categories"]
+        assert run["issues"]["samples_without_reads"] == []
+        assert run["issues"]["samples_without_contigs"] == ["A1"]
+
+        (tmp_path / "per_seq.sh").write_text("reads $sample.display_name\n")
+        (tmp_path / "per_asm.sh").write_text("assembly $sample.display_name\n")
+        script = pipeline.generate_run_script(run, samples, None, str(tmp_path / "per_seq.sh"), None, str(tmp_path / "per_asm.sh"))
+        assert script == "reads S0\nreads S1\nassembly A0\n"
+
+    @pytest.mark.parametrize("plan", [False, True])
+    def test_samples_with_unknown_file_types_are_left_out(self, db, component, run_folder, tmp_path, plan):
+        folder = run_folder("reads", 2)
+        (folder / "X_1.txt").touch()
+        (folder / "X_2.txt").touch()
+        with open(folder / "run_metadata.tsv", "a") as fh:
+            fh.write("X\tStaphylococcus aureus\tX_1.txt/X_2.txt\n")
+        (tmp_path / "out").mkdir()
+        pipeline.instrumentation.reset()
+        run, samples, run_mode = pipeline.initialize_run(run=Run(name="unknown"), samples=[], component=component, input_folder=str(folder),
+                                                         run_metadata=str(folder / "run_metadata.tsv"), run_type="test", outdir=str(tmp_path / "out"), plan=plan)
+        assert [sample["display_name"] for sample in samples] == ["S0", "S1"]
+        assert len(run.samples) == 2
+        assert run["issues"]["samples_with_unknown_file_types"] == ["X"]
+        assert pipeline.instrumentation.current().counters["samples_saved"] == 2
+        (tmp_path / "per_seq.sh").write_text("reads $sample.display_name\n")
+        assert pipeline.generate_run_script(run, samples, None, str(tmp_path / "per_seq.sh"), None) == "reads S0\nreads S1\n"
+        if not plan:
+            assert db.samples.count_documents({}) == 2
+            assert len(snapshot.read_snapshot(str(tmp_path / "out"))[1]) == 2
+
+
+class TestReadMetadata:
+    @pytest.fixture
+    def sheet(self, tmp_path):
+        (tmp_path / "rename.json").write_text('{"SampleID": "sample_name", "Organism": "provided_species"}')
+        (tmp_path / "run_metadata.tsv").write_text(
+            "SampleID\tOrganism\tfilenames\tpriority\tcomments\n"
+            "S1\tStaphylococcus aureus\tS1_R1.fastq.gz/S1_R2.fastq.gz\t1\tLooks good\n"
+            "S2\tStaphylococcus aureus\tS2_R1.fastq.gz/S2_R2.fastq.gz\t2\t\n"
+        )
+        return tmp_path
+
+    def test_arrow_engine_matches_pandas(self, sheet):
+        pytest.importorskip("pyarrow")
+        pandas_metadata = pipeline.format_metadata(str(sheet / "run_metadata.tsv"), str(sheet / "rename.json"))
+        arrow_metadata = pipeline.format_metadata(str(sheet / "run_metadata.tsv"), str(sheet / "rename.json"), engine="arrow")
+        assert pipeline.metadata_to_records(arrow_metadata) == pipeline.metadata_to_records(pandas_metadata)
+
+    @pytest.mark.parametrize("extension", [".parquet", ".feather"])
+    def test_binary_sheets_with_projection(self, sheet, extension):
+        pytest.importorskip("pyarrow")
+        import pandas as pd
+        binary_sheet = str(sheet / f"run_metadata{extension}")
+        df = pd.read_table(sheet / "run_metadata.tsv")
+        df.to_parquet(binary_sheet) if extension == ".parquet" else df.to_feather(binary_sheet)
+        metadata = pipeline.format_metadata(binary_sheet, str(sheet / "rename.json"), columns=["priority"])
+        assert list(metadata["sample_name"]) == ["S1", "S2"]
+        assert "comments" not in metadata.columns
+        assert list(metadata["priority"]) == [1, 2]
+
+
+class TestFileTable:
+    def test_flat_scan_matches_listdir(self, run_folder):
+        folder = run_folder("reads", 3)
+        (folder / "old_run").mkdir()
+        file_table = pipeline.FileTable(str(folder))
+        assert file_table.names() == set(os.listdir(folder))
+        assert file_table.stat_calls == 7
+        assert file_table.get("S0_R1.fastq.gz").mode == "SEQ"
+        assert file_table.get("S0_R1.fastq.gz").path == os.path.abspath(folder / "S0_R1.fastq.gz")
+
+    def test_recursive_scan_finds_files_in_sample_folders(self, run_folder):
+        folder = run_folder("reads", 0)
+        for sample_name in ["S1", "S2"]:
+            (folder / sample_name).mkdir()
+            (folder / sample_name / f"{sample_name}.fasta").touch()
+            (folder / sample_name / "notes.txt").touch()
+        file_table = pipeline.FileTable(str(folder), recursive=True)
+        assert file_table.get("S1.fasta").name == "S1/S1.fasta"
+        assert file_table.get("S2/notes.txt") is not None
+        assert "notes.txt" not in file_table # ambiguous across folders
+        assert "S1.fasta" not in pipeline.FileTable(str(folder))
+
+
+class TestRunPipeline:
+    @pytest.fixture
+    def pipeline_args(self, component, run_folder, tmp_path):
+        '''Namespace with the launcher defaults for run_pipeline, with the example pre/post scripts and a reads folder of 5 samples.'''
+        examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+        folder = run_folder("reads", 5)
+        (tmp_path / "per_sample.sh").write_text("run $sample.display_name $sample.categories.paired_reads.summary.data[0]\n")
+        return argparse.Namespace(
+            outdir=str(tmp_path / "out"), run_id=None, run_name="launched", run_type="test", re_run=False, incremental=False,
+            reads_folder=str(folder), run_metadata=str(folder / "run_metadata.tsv"), run_metadata_column_remap=None,
+            pre_script=os.path.join(examples, "pre_script.sh"), per_sample_script=str(tmp_path / "per_sample.sh"),
+            post_script=os.path.join(examples, "post_script.sh"), per_sample_asm_script=None, component=component,
+            component_subset="bifrost_min_read_check", sample_subset=None, check_reads=False, min_reads=0, jobs=1, no_cache=False,
+            metadata_columns=None, metadata_engine="pandas", recursive_scan=False, db_writers=0, shard_size=0, execute=False,
+            scheduler=None, snapshot_compress=False, from_snapshot=False, plan=False, debug=False)
+
+    def test_launch_report(self, db, pipeline_args, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path / "reads")
+        (tmp_path / "per_sample.sh").write_text("echo Ångström $sample.display_name\n", encoding="utf-8")
+        pipeline.run_pipeline(pipeline_args)
+        assert os.getcwd() == str(tmp_path / "reads") # every output goes to outdir without changing directory
+        assert not os.path.exists(tmp_path / "reads" / "run_script.sh")
+        with open(os.path.join(pipeline_args.outdir, "launch_report.json")) as fh:
+            report = json.load(fh)
+        assert {"launch", "format_metadata", "parse_directory", "build_samples", "save_samples", "save_run", "render_scripts"} <= set(report["phases"])
+        assert report["counters"]["samples"] == 5
+        assert report["counters"]["files_stat"] == 11
+        assert report["counters"]["bytes_rendered"] == os.path.getsize(os.path.join(pipeline_args.outdir, "run_script.sh"))
+        assert set(report["peak_rss_growth_kb"]) == set(report["phases"])
+        assert report["process_peak_rss_kb"] >= max(report["peak_rss_growth_kb"].values())
+        assert db.runs.find_one({"name": "launched"})["launch_report"] == report
+        assert db.runs.find_one({"name": "launched"})["path"] == pipeline_args.outdir
+
+    def test_plan_without_db(self, db, pipeline_args, monkeypatch, tmp_path):
+        class NoConnection:
+            def __getattr__(self, name):
+                pytest.fail("DB accessed while planning")
+        (tmp_path / "reads" / "Undetermined_R1.fastq.gz").touch()
+        with open(tmp_path / "reads" / "run_metadata.tsv", "a") as fh:
+            fh.write("S9\tStaphylococcus aureus\tS9_R1.fastq.gz/S9_R2.fastq.gz\n")
+        (tmp_path / "per_sample.sh").write_text("run $sample._id $sample.display_name\n")
+        monkeypatch.setattr(database_interface, "CONNECTION", NoConnection())
+        pipeline_args.plan = True
+        pipeline.run_pipeline(pipeline_args)
+        with open(os.path.join(pipeline_args.outdir, pipeline.PLAN_FOLDER, pipeline.PLAN_NAME)) as fh:
+            plan = json.load(fh)
+        assert plan["samples"] == 5
+        assert "Undetermined_R1.fastq.gz" in plan["issues"]["unused_files"]
+        assert plan["issues"]["samples_without_reads"] == ["S9"]
+        assert plan["estimated_db_operations"]["sample_inserts"] == 5
+        with open(os.path.join(pipeline_args.outdir, pipeline.PLAN_FOLDER, "run_script.sh")) as fh:
+            assert f"run {pipeline.placeholder_id(1)['$oid']} S0\n" in fh.read()
+        assert os.listdir(pipeline_args.outdir) == [pipeline.PLAN_FOLDER] # no run_script.sh, snapshot or file cache of a launch
+
+        monkeypatch.undo()
+        pipeline_args.plan = False
+        pipeline.run_pipeline(pipeline_args)
+        # name check, one bulk write, the run save with its list_collection_names and the report update,
+        # mongomock sends no commands so the launch's db_round_trips is covered in test_database
+        assert plan["estimated_db_operations"]["round_trips"] == 5
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_relaunch_from_snapshot(self, db, pipeline_args, monkeypatch, compress):
+        pipeline_args.snapshot_compress = compress
+        pipeline.run_pipeline(pipeline_args)
+        run_json, samples_json = snapshot.read_snapshot(pipeline_args.outdir)
+        run_document = pipeline.database_interface.bson_to_json(db.runs.find_one({"name": "launched"}))
+        assert run_json == {key: value for key, value in run_document.items() if key != "launch_report"}
+        assert [sample_json["display_name"] for sample_json in samples_json] == [f"S{i}" for i in range(5)]
+
+        monkeypatch.setattr(pipeline, "load_samples", lambda *args: pytest.fail("samples loaded from DB"))
+        monkeypatch.setattr(pipeline.Run, "load", lambda *args: pytest.fail("run loaded from DB"))
+        pipeline_args.incremental = pipeline_args.from_snapshot = True
+        pipeline.run_pipeline(pipeline_args)
+        with open(os.path.join(pipeline_args.outdir, "launch_report.json")) as fh:
+            assert json.load(fh)["counters"]["samples_saved"] == 0
+        assert len(snapshot.read_snapshot(pipeline_args.outdir)[1]) == 5
+
+    @pytest.mark.parametrize("relaunch", ["incremental", "re_run"])
+    def test_snapshot_relaunch_keeps_categories_written_since(self, db, pipeline_args, relaunch):
+        pipeline.run_pipeline(pipeline_args)
+        sample_name = pipeline.Run(name="launched").sample_name_generator("S1")
+        db.samples.update_one({"name": sample_name}, {"$set": {"categories.assemblatron": {"summary": {"contigs": 42}}}})
+        with open(pipeline_args.run_metadata) as fh:
+            sheet = fh.read()
+        with open(pipeline_args.run_metadata, "w") as fh:
+            fh.write(sheet.replace("S1\tStaphylococcus aureus", "S1\tEscherichia coli"))
+
+        setattr(pipeline_args, relaunch, True)
+        pipeline_args.from_snapshot = True
+        pipeline.run_pipeline(pipeline_args)
+        document = db.samples.find_one({"name": sample_name})
+        assert document["categories"]["assemblatron"] == {"summary": {"contigs": 42}}
+        assert document["categories"]["sample_info"]["summary"]["provided_species"] == "Escherichia coli"
+
+    def test_scheduler_resources_of_a_component_installed_without_them(self, db, pipeline_args, capsys):
+        pipeline_args.component = {**pipeline_args.component, "options": {}}
+        pipeline_args.component_subset = "bifrost_assemblatron_v2_2_16"
+        pipeline_args.shard_size = 1
+        pipeline_args.scheduler = "slurm"
+        pipeline.run_pipeline(pipeline_args)
+        assert "The component in the DB has no scheduler_resources" in capsys.readouterr().err
+        with open(os.path.join(pipeline_args.outdir, "shards", "array.slurm")) as fh:
+            assert "#SBATCH --cpus-per-task=8\n" in fh.read() # from config.yaml
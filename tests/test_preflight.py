@@ -0,0 +1,79 @@
+import gzip
+import pytest
+from bifrost_run_launcher import preflight
+from bifrost_run_launcher.file_cache import FileCache
+
+
+def write_fastq(path, reads, compress=True):
+    records = "".join(f"@read{i}\nACGT\n+\nIIII\n" for i in range(reads)).encode()
+    if compress:
+        records = gzip.compress(records)
+    path.write_bytes(records)
+    return str(path)
+
+
+class TestCountReads:
+    def test_plain_and_gzip(self, tmp_path):
+        assert preflight.count_reads(write_fastq(tmp_path / "a.fastq", 10, compress=False))["reads"] == 10
+        assert preflight.count_reads(write_fastq(tmp_path / "a.fastq.gz", 10))["reads"] == 10
+
+    def test_multi_member_gzip(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(preflight, "CHUNK_SIZE", 7)
+        path = tmp_path / "multi.fastq.gz"
+        path.write_bytes(gzip.compress(b"@r\nA\n+\nI\n" * 3) + gzip.compress(b"@r\nA\n+\nI\n" * 2))
+        assert preflight.count_reads(str(path)) == {"path": str(path), "reads": 5, "error": None}
+
+    def test_truncated_gzip(self, tmp_path):
+        path = tmp_path / "truncated.fastq.gz"
+        path.write_bytes(gzip.compress(b"@r\nA\n+\nI\n" * 1000)[:-20])
+        assert "truncated" in preflight.count_reads(str(path))["error"]
+
+    def test_partial_record(self, tmp_path):
+        path = tmp_path / "partial.fastq"
+        path.write_bytes(b"@r\nA\n+\nI\n@r\nA")
+        assert preflight.count_reads(str(path))["error"] is not None
+
+
+class TestCheckReadPairs:
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_pairs(self, tmp_path, processes):
+        read_pairs = {
+            "good": (write_fastq(tmp_path / "good_R1.fastq.gz", 20), write_fastq(tmp_path / "good_R2.fastq.gz", 20)),
+            "unequal": (write_fastq(tmp_path / "unequal_R1.fastq.gz", 20), write_fastq(tmp_path / "unequal_R2.fastq.gz", 19)),
+            "empty": (write_fastq(tmp_path / "empty_R1.fastq.gz", 0), write_fastq(tmp_path / "empty_R2.fastq.gz", 0)),
+            "few": (write_fastq(tmp_path / "few_R1.fastq.gz", 5), write_fastq(tmp_path / "few_R2.fastq.gz", 5)),
+        }
+        results = preflight.check_read_pairs(read_pairs, min_reads=10, processes=processes)
+        assert results["good"] == {"read_counts": [20, 20], "passed": True, "reason": None}
+        assert [name for name, result in results.items() if not result["passed"]] == ["unequal", "empty", "few"]
+
+
+class TestFileCache:
+    def test_unchanged_files_are_not_read_again(self, tmp_path, monkeypatch):
+        read_pairs = {"S1": (write_fastq(tmp_path / "S1_R1.fastq.gz", 3), write_fastq(tmp_path / "S1_R2.fastq.gz", 3))}
+        with FileCache(str(tmp_path / "cache.sqlite")) as cache:
+            first = preflight.check_read_pairs(read_pairs, processes=1, cache=cache)
+        counted = []
+        monkeypatch.setattr(preflight, "count_reads", lambda path: counted.append(path) or {"path": path, "reads": 0, "error": None})
+        with FileCache(str(tmp_path / "cache.sqlite")) as cache:
+            assert preflight.check_read_pairs(read_pairs, processes=1, cache=cache) == first
+            assert counted == []
+            write_fastq(tmp_path / "S1_R2.fastq.gz", 4)
+            preflight.check_read_pairs(read_pairs, processes=1, cache=cache)
+            assert counted == [read_pairs["S1"][1]]
+
+    def test_scanned_signatures_save_every_stat(self, tmp_path, monkeypatch):
+        read_pairs = {"S1": (write_fastq(tmp_path / "S1_R1.fastq.gz", 3), write_fastq(tmp_path / "S1_R2.fastq.gz", 3))}
+        signatures = {path: FileCache._signature(path)[1:] for path in read_pairs["S1"]}
+        with FileCache(str(tmp_path / "cache.sqlite")) as cache:
+            monkeypatch.setattr(FileCache, "_signature", staticmethod(lambda path: pytest.fail(f"{path} stat'd again")))
+            first = preflight.check_read_pairs(read_pairs, processes=1, cache=cache, signatures=signatures)
+            assert preflight.check_read_pairs(read_pairs, processes=1, cache=cache, signatures=signatures) == first
+
+    def test_eviction(self, tmp_path):
+        with FileCache(str(tmp_path / "cache.sqlite"), max_entries=2) as cache:
+            for i in range(5):
+                cache.set(write_fastq(tmp_path / f"{i}.fastq", 1, compress=False), "reads", i)
+            assert cache.evict() == 3
+            assert cache.get(str(tmp_path / "4.fastq"), "reads") == 4
+            assert cache.get(str(tmp_path / "0.fastq"), "reads") is None
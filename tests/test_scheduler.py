@@ -0,0 +1,125 @@
+import os
+import pytest
+from bifrost_run_launcher import executor
+from bifrost_run_launcher import launcher
+from bifrost_run_launcher import scheduler
+
+
+RESOURCE_HINTS = {
+    "default": {"cpus": 1, "memory_gb": 4, "time_minutes": 60, "queue": "short"},
+    "bifrost_assemblatron": {"cpus": 8, "memory_gb": 32, "time_minutes": 240},
+    "bifrost_whats_my_species": {"cpus": 4, "memory_gb": 64},
+}
+
+
+@pytest.fixture
+def outdir(tmp_path):
+    blocks = [(f"S{i}", f"echo S{i}\n") for i in range(3)]
+    executor.write_shards(str(tmp_path), blocks, pre_script="echo pre\n", post_script="echo post\n")
+    return tmp_path
+
+
+def test_resources_are_the_largest_over_components():
+    assert scheduler.get_resources(RESOURCE_HINTS) == RESOURCE_HINTS["default"]
+    assert scheduler.get_resources(RESOURCE_HINTS, ["bifrost_assemblatron", "bifrost_whats_my_species", "bifrost_min_read_check"]) == \
+        {"cpus": 8, "memory_gb": 64, "time_minutes": 240, "queue": "short"}
+
+
+def test_slurm_snapshot(outdir):
+    submit_path = scheduler.write_submission(str(outdir), "slurm", "run1", RESOURCE_HINTS, ["bifrost_assemblatron"])
+    shards = outdir / "shards"
+    assert open(submit_path).read() == (
+        "#!/usr/bin/env bash\n"
+        "set -euo pipefail\n"
+        f"cd \"{shards}\"\n"
+        "pre_id=$(sbatch --parsable pre.slurm | cut -d';' -f1)\n"
+        "echo \"Submitted pre job ${pre_id}\"\n"
+        "array_id=$(sbatch --parsable --dependency=afterok:${pre_id} array.slurm | cut -d';' -f1)\n"
+        "echo \"Submitted array job ${array_id}\"\n"
+        "post_id=$(sbatch --parsable --dependency=afterok:${array_id} post.slurm | cut -d';' -f1)\n"
+        "echo \"Submitted post job ${post_id}\"\n"
+    )
+    assert (shards / "array.slurm").read_text() == (
+        "#!/usr/bin/env bash\n"
+        "#SBATCH --job-name=run1_samples\n"
+        f"#SBATCH --output={shards}/logs/array_%a\n"
+        "#SBATCH --cpus-per-task=8\n"
+        "#SBATCH --mem=32G\n"
+        "#SBATCH --time=04:00:00\n"
+        "#SBATCH --partition=short\n"
+        "#SBATCH --array=1-3\n"
+        f"cd \"{outdir}\"\n"
+        "script=$(sed -n \"${SLURM_ARRAY_TASK_ID}p\" shards/manifest.tsv | cut -f1)\n"
+        "exec bash \"$script\"\n"
+    )
+    assert (shards / "pre.slurm").read_text().endswith(f"cd \"{outdir}\"\nexec bash shards/pre.sh\n")
+
+
+@pytest.mark.parametrize("name,array,depend", [
+    ("sge", "#$ -t 1-3", "qsub -terse -hold_jid ${array_id} post.sge | cut -d. -f1"),
+    ("pbs", "#PBS -J 1-3", "qsub -W depend=afterok:${array_id} post.pbs)"),
+])
+def test_task_arrays(outdir, name, array, depend):
+    submit = open(scheduler.write_submission(str(outdir), name, "run1")).read()
+    assert depend in submit
+    assert array in (outdir / "shards" / f"array.{name}").read_text()
+
+
+@pytest.mark.parametrize("name,log", [
+    ("slurm", "#SBATCH --output={logs}/array_%a\n"),
+    ("sge", "#$ -o {logs}/array_$TASK_ID -j y\n"),
+    ("pbs", "#PBS -o {logs}/array_^array_index^ -j oe\n"),
+])
+def test_array_tasks_log_to_their_own_file(outdir, name, log):
+    scheduler.write_submission(str(outdir), name, "run1")
+    assert log.format(logs=outdir / "shards" / "logs") in (outdir / "shards" / f"array.{name}").read_text()
+
+
+def test_sge_holds_on_job_ids(outdir, tmp_path):
+    """qsub -terse prints <id>.1-<tasks>:1 for an array job, the post job must hold on the id, not on a job name an earlier launch shares"""
+    (tmp_path / "bin").mkdir()
+    qsub = tmp_path / "bin" / "qsub"
+    qsub.write_text(f"#!/usr/bin/env bash\necho \"$@\" >> {tmp_path / 'qsub.log'}\n"
+                    "case \"${@: -1}\" in pre.sge) echo 11;; array.sge) echo 12.1-3:1;; *) echo 13;; esac\n")
+    qsub.chmod(0o755)
+    submit_path = scheduler.write_submission(str(outdir), "sge", "run1")
+    assert os.system(f"PATH={tmp_path / 'bin'}:$PATH bash {submit_path} > /dev/null") == 0
+    assert (tmp_path / "qsub.log").read_text().splitlines() == ["-terse pre.sge", "-terse -hold_jid 11 array.sge", "-terse -hold_jid 12 post.sge"]
+
+
+def test_sge_memory_is_per_slot(outdir):
+    scheduler.write_submission(str(outdir), "sge", "run1", RESOURCE_HINTS, ["bifrost_assemblatron"])
+    array_script = (outdir / "shards" / "array.sge").read_text()
+    assert "#$ -pe smp 8\n" in array_script
+    assert "#$ -l h_vmem=4096M\n" in array_script # 32G over 8 slots
+
+
+def test_large_arrays_are_split(outdir, monkeypatch):
+    monkeypatch.setitem(scheduler.SCHEDULERS["slurm"], "max_array_size", 2)
+    submit = open(scheduler.write_submission(str(outdir), "slurm", "run1")).read()
+    assert "array_1_id=$(sbatch --parsable --dependency=afterok:${pre_id} array_1.slurm | cut -d';' -f1)\n" in submit
+    assert "array_2_id=$(sbatch --parsable --dependency=afterok:${pre_id} array_2.slurm | cut -d';' -f1)\n" in submit
+    assert "post_id=$(sbatch --parsable --dependency=afterok:${array_1_id}:${array_2_id} post.slurm | cut -d';' -f1)\n" in submit
+    shards = outdir / "shards"
+    assert "#SBATCH --array=1-2\n" in (shards / "array_1.slurm").read_text()
+    assert "#SBATCH --array=1-1\n" in (shards / "array_2.slurm").read_text()
+    assert not (shards / "array.slurm").exists()
+    assert os.system(f"SLURM_ARRAY_TASK_ID=1 bash {shards / 'array_2.slurm'}") == 0
+    assert executor.read_exit_status(str(shards / "shard_00002.sh")) == 0
+    assert executor.read_exit_status(str(shards / "shard_00000.sh")) is None
+
+
+def test_array_task_runs_its_shard(outdir):
+    scheduler.write_submission(str(outdir), "slurm", "run1")
+    array_script = outdir / "shards" / "array.slurm"
+    assert os.system(f"SLURM_ARRAY_TASK_ID=2 bash {array_script}") == 0
+    assert executor.read_exit_status(str(outdir / "shards" / "shard_00001.sh")) == 0
+    assert executor.read_exit_status(str(outdir / "shards" / "shard_00000.sh")) is None
+
+
+def test_scheduler_and_execute_are_rejected(installed_component, run_folder, launcher_args, capsys):
+    args = launcher.run_folder_arguments(str(run_folder("run1", 1))) + launcher_args + ["--shard_size", "1", "--scheduler", "slurm"]
+    assert launcher.parse_pipeline_options(args).scheduler == "slurm"
+    with pytest.raises(SystemExit):
+        launcher.parse_pipeline_options(args + ["--execute"])
+    assert "--execute runs the shards here and --scheduler submits them" in capsys.readouterr().err